@@ -0,0 +1,106 @@
+# app/bloom.py
+import asyncio
+import hashlib
+import math
+from sqlalchemy import select
+from database import AsyncSessionLocal, URL
+from config import settings
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+    Answers "definitely not present" or "possibly present"; never has false negatives
+    for items that were added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        """
+        Derives num_hashes bit positions from one 128-bit digest (double hashing).
+        """
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+class ShortCodeFilter(BloomFilter):
+    """
+    Bloom filter of every issued short code, built from the urls table at startup.
+    Until loading finishes (or after it is reset), `ready` is False and the filter
+    must not be used to reject lookups.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        super().__init__(capacity, error_rate)
+        self.ready = False
+        self.rejections = 0
+        self._load_task: asyncio.Task | None = None
+
+    def might_contain(self, short_code: str) -> bool:
+        """
+        Returns False only when the filter is loaded and the code was never issued.
+        """
+        if not self.ready or short_code in self:
+            return True
+        self.rejections += 1
+        return False
+
+    async def load(self, batch_size: int = 10000):
+        """
+        Streams every short code from the urls table into the filter.
+        Codes added concurrently by create_short_url are kept, since bits are only ever set.
+        """
+        print("Loading short code Bloom filter...")
+        async with AsyncSessionLocal() as session:
+            result = await session.stream_scalars(
+                select(URL.short_code).execution_options(yield_per=batch_size)
+            )
+            async for short_code in result:
+                self.add(short_code)
+        self.ready = True
+        print(f"Short code Bloom filter loaded ({self.count} codes).")
+
+    def start_loading(self):
+        """
+        Loads the filter in the background unless a load is already running.
+        """
+        if self._load_task is None or self._load_task.done():
+            self._load_task = asyncio.create_task(self._load_safely())
+
+    async def _load_safely(self):
+        try:
+            await self.load()
+        except Exception as e:
+            print(f"Failed to load short code Bloom filter: {e}")
+
+    def stats(self) -> dict:
+        """
+        Returns sizing and rejection counters.
+        """
+        return {
+            "ready": self.ready,
+            "capacity": self.capacity,
+            "error_rate": self.error_rate,
+            "num_bits": self.num_bits,
+            "num_hashes": self.num_hashes,
+            "items": self.count,
+            "rejections": self.rejections,
+        }
+
+# Process-wide filter of issued short codes
+short_code_filter = ShortCodeFilter(settings.BLOOM_CAPACITY, settings.BLOOM_ERROR_RATE)
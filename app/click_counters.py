@@ -0,0 +1,194 @@
+# app/click_counters.py
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, func, bindparam, ARRAY, String, BigInteger
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from redis.asyncio import Redis
+from redis.exceptions import LockError, ResponseError
+from database import AsyncSessionLocal, URL, ClickCounterFlush
+from config import settings
+
+# Clicks per short code not yet added to urls.total_clicks; incremented by the click script
+PENDING_CLICKS_KEY = "clicks:pending"
+# Names of pending hashes that were swapped out for writing back but not yet deleted
+IN_FLIGHT_SET_KEY = "clicks:pending:in-flight"
+WRITE_BACK_LOCK_KEY = "clicks:pending:lock"
+
+async def unflushed_clicks(redis_client: Redis, short_codes: list[str]) -> list[int]:
+    """
+    Clicks per code that are counted in Redis but not yet in urls.total_clicks:
+    the pending hash plus any in-flight hashes. The pending hash is read before the
+    in-flight set, and a write-back only deletes its in-flight key after committing,
+    so a concurrent write-back can make clicks count twice but never drop them,
+    as long as urls.total_clicks is read afterwards.
+    """
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hmget(PENDING_CLICKS_KEY, short_codes)
+        pipe.smembers(IN_FLIGHT_SET_KEY)
+        pending, in_flight_keys = await pipe.execute()
+    replies = [pending]
+    if in_flight_keys:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for key in in_flight_keys:
+                pipe.hmget(key, short_codes)
+            replies.extend(await pipe.execute())
+    return [sum(int(reply[i] or 0) for reply in replies) for i in range(len(short_codes))]
+
+class ClickCounterWriteBack:
+    """
+    Periodically moves the clicks:pending hash into urls.total_clicks.
+    Each run renames the hash to a uniquely named in-flight key (so new clicks go to a
+    fresh hash), adds every delta with one UPDATE ... FROM unnest(...), and deletes
+    the key once the transaction has committed. A flush ID stored in the same
+    transaction makes a retried flush a no-op, so in-flight keys left behind by a
+    crash are written back exactly once on the next run, including at startup.
+    """
+
+    def __init__(self, flush_interval: float, session_factory=None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.flush_interval = flush_interval
+        self.flushes = 0
+        self.codes_updated = 0
+        self.clicks_written = 0
+        self.last_error: str | None = None
+        self._task: asyncio.Task | None = None
+
+    async def _swap_pending(self, redis_client: Redis) -> str | None:
+        """
+        Renames the pending hash to a new in-flight key. Returns None if there is nothing pending.
+        """
+        in_flight_key = f"{PENDING_CLICKS_KEY}:{uuid.uuid4().hex}"
+        await redis_client.sadd(IN_FLIGHT_SET_KEY, in_flight_key)
+        try:
+            await redis_client.rename(PENDING_CLICKS_KEY, in_flight_key)
+        except ResponseError:
+            # No such key: no clicks since the last flush
+            await redis_client.srem(IN_FLIGHT_SET_KEY, in_flight_key)
+            return None
+        return in_flight_key
+
+    async def _write_back(self, redis_client: Redis, in_flight_key: str):
+        """
+        Adds one in-flight hash to urls.total_clicks, unless it was already applied, then deletes it.
+        """
+        deltas = await redis_client.hgetall(in_flight_key)
+        if deltas:
+            async with self.session_factory() as session:
+                applied = await session.scalar(
+                    pg_insert(ClickCounterFlush)
+                    .values(flush_id=in_flight_key)
+                    .on_conflict_do_nothing()
+                    .returning(ClickCounterFlush.flush_id)
+                )
+                if applied is not None:
+                    increments = select(
+                        func.unnest(bindparam("codes", list(deltas), type_=ARRAY(String))).label("short_code"),
+                        func.unnest(bindparam("deltas", [int(d) for d in deltas.values()], type_=ARRAY(BigInteger))).label("delta"),
+                    ).subquery()
+                    await session.execute(
+                        update(URL)
+                        .where(URL.short_code == increments.c.short_code)
+                        .values(total_clicks=URL.total_clicks + increments.c.delta)
+                        .execution_options(synchronize_session=False)
+                    )
+                    self.codes_updated += len(deltas)
+                    self.clicks_written += sum(int(d) for d in deltas.values())
+                await session.commit()
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(in_flight_key)
+            pipe.srem(IN_FLIGHT_SET_KEY, in_flight_key)
+            await pipe.execute()
+
+    async def flush(self, redis_client: Redis):
+        """
+        Writes back in-flight hashes left by earlier runs, then the current pending hash.
+        """
+        in_flight_keys = await redis_client.smembers(IN_FLIGHT_SET_KEY)
+        swapped = await self._swap_pending(redis_client)
+        if swapped is not None:
+            in_flight_keys.add(swapped)
+        for in_flight_key in sorted(in_flight_keys):
+            await self._write_back(redis_client, in_flight_key)
+        self.flushes += 1
+        # Flush IDs only need to outlive a retry
+        async with self.session_factory() as session:
+            await session.execute(
+                delete(ClickCounterFlush).where(ClickCounterFlush.flushed_at < datetime.utcnow() - timedelta(days=1))
+            )
+            await session.commit()
+
+    async def _flush_locked(self, redis_client: Redis, blocking_timeout: float | None = None):
+        """
+        Flushes under the write-back lock, so only one worker writes back at a time.
+        Without a blocking_timeout, gives up immediately if another worker holds the lock.
+        """
+        lock = redis_client.lock(WRITE_BACK_LOCK_KEY, timeout=60)
+        if blocking_timeout is None:
+            acquired = await lock.acquire(blocking=False)
+        else:
+            acquired = await lock.acquire(blocking_timeout=blocking_timeout)
+        if not acquired:
+            return
+        try:
+            await self.flush(redis_client)
+            self.last_error = None
+        finally:
+            try:
+                await lock.release()
+            except LockError:
+                pass
+
+    async def _run(self, redis_client: Redis):
+        """
+        Write-back loop.
+        """
+        while True:
+            try:
+                await self._flush_locked(redis_client)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Click counter write-back failed: {e}")
+            await asyncio.sleep(self.flush_interval)
+
+    def start(self, redis_client: Redis):
+        """
+        Starts the background write-back; its first run picks up in-flight keys left by a crash.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(redis_client))
+
+    async def stop(self, redis_client: Redis | None = None):
+        """
+        Cancels the background write-back, then runs a final flush if a Redis client is given.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if redis_client is not None:
+            try:
+                await self._flush_locked(redis_client, blocking_timeout=5)
+            except Exception as e:
+                print(f"Final click counter write-back failed: {e}")
+
+    async def stats(self, redis_client: Redis) -> dict:
+        """
+        Returns the number of codes with pending clicks and this worker's write-back counters.
+        """
+        return {
+            "pending_codes": await redis_client.hlen(PENDING_CLICKS_KEY),
+            "in_flight": await redis_client.scard(IN_FLIGHT_SET_KEY),
+            "flushes": self.flushes,
+            "codes_updated": self.codes_updated,
+            "clicks_written": self.clicks_written,
+            "last_error": self.last_error,
+        }
+
+# Process-wide write-back job
+click_counter_write_back = ClickCounterWriteBack(settings.CLICK_COUNTER_FLUSH_INTERVAL_SECONDS)
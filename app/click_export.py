@@ -0,0 +1,57 @@
+# app/click_export.py
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator
+from sqlalchemy import select
+from database import AsyncSessionLocal, ClickEvent
+from config import settings
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+CSV_HEADER = ["timestamp", "ip_address"]
+
+def _encode_rows(rows, export_format: str) -> bytes:
+    """
+    Serialises one batch of (timestamp, ip_address) rows.
+    """
+    if export_format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows((timestamp.isoformat(), ip_address or "") for timestamp, ip_address in rows)
+        return buffer.getvalue().encode()
+    return "".join(
+        json.dumps({"timestamp": timestamp.isoformat(), "ip_address": ip_address}) + "\n"
+        for timestamp, ip_address in rows
+    ).encode()
+
+async def export_clicks(url_id: int, export_format: str, compress: bool, session_factory=None) -> AsyncIterator[bytes]:
+    """
+    Yields every click of one URL, oldest first, as NDJSON or CSV, optionally gzipped.
+    Rows come from a server-side cursor in batches of CLICK_EXPORT_BATCH_SIZE and are
+    encoded and compressed batch by batch, so memory use does not grow with the number of clicks.
+    The session is opened here from session_factory (default AsyncSessionLocal) rather than
+    per request, since the response outlives the endpoint.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def emit(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+
+    if export_format == "csv":
+        yield emit((",".join(CSV_HEADER) + "\r\n").encode())
+    async with (session_factory or AsyncSessionLocal)() as session:
+        result = await session.stream(
+            select(ClickEvent.timestamp, ClickEvent.ip_address)
+            .filter(ClickEvent.short_code_id == url_id)
+            .order_by(ClickEvent.timestamp)
+            .execution_options(yield_per=settings.CLICK_EXPORT_BATCH_SIZE)
+        )
+        async for rows in result.partitions():
+            chunk = emit(_encode_rows(rows, export_format))
+            if chunk:
+                yield chunk
+    if compressor:
+        yield compressor.flush()
@@ -0,0 +1,173 @@
+# app/click_ingest.py
+import asyncio
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal, ClickEvent
+from rollups import apply_click_rollups
+from config import settings
+
+class ClickIngestor:
+    """
+    Buffers click events in a bounded in-memory queue and writes them to
+    click_events in batches from a background consumer.
+    A batch is flushed when it reaches batch_size or flush_interval seconds pass.
+    `writer` selects how a batch reaches Postgres: "copy" streams it with the binary
+    COPY protocol, "insert" sends one multi-row INSERT.
+    """
+
+    def __init__(self, max_queue_size: int, batch_size: int, flush_interval: float, writer: str = "copy", session_factory=None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.batch_size = batch_size
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def submit(self, url_id: int, ip_address: str | None) -> bool:
+        """
+        Queues a click without waiting on the database.
+        Returns False (and counts a drop) if the queue is full.
+        """
+        try:
+            self._queue.put_nowait((url_id, ip_address, datetime.utcnow()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _drain(self) -> list[tuple]:
+        """
+        Takes up to batch_size queued clicks without blocking.
+        """
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _copy(self, session: AsyncSession, batch: list[tuple]):
+        """
+        Streams a batch into click_events with asyncpg's binary COPY on the session's
+        connection. Skips ORM statement compilation and per-row parameter binding entirely.
+        The session must already have executed a statement: SQLAlchemy's asyncpg adapter
+        only begins its transaction on the first execute, so a COPY issued before that
+        would autocommit on its own.
+        """
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            ClickEvent.__tablename__,
+            records=[(url_id, timestamp, ip_address) for url_id, ip_address, timestamp in batch],
+            columns=["short_code_id", "timestamp", "ip_address"],
+        )
+
+    async def _insert(self, session: AsyncSession, batch: list[tuple]):
+        """
+        Writes a batch as a single multi-row INSERT.
+        """
+        rows = [
+            {"short_code_id": url_id, "ip_address": ip_address, "timestamp": timestamp}
+            for url_id, ip_address, timestamp in batch
+        ]
+        await session.execute(insert(ClickEvent).values(rows))
+
+    async def _flush(self, batch: list[tuple]):
+        """
+        Updates the click rollups, writes one batch in the same transaction, and commits once.
+        The rollup upsert runs first because it is what begins the transaction the COPY joins.
+        """
+        async with self.session_factory() as session:
+            await apply_click_rollups(session, [(url_id, timestamp) for url_id, _, timestamp in batch])
+            if self.writer == "copy":
+                await self._copy(session, batch)
+            else:
+                await self._insert(session, batch)
+            await session.commit()
+        self.written += len(batch)
+        self.batches += 1
+
+    async def _flush_with_retry(self, batch: list[tuple]):
+        """
+        Flushes a batch, retrying once: a flush is one transaction, so a failed attempt
+        (e.g. a deadlock or serialization victim) leaves nothing behind. A batch that
+        fails twice is counted in `failed` and its clicks are lost.
+        """
+        for attempt in (1, 2):
+            try:
+                await self._flush(batch)
+                return
+            except Exception as e:
+                print(f"Failed to write {len(batch)} click events (attempt {attempt}): {e}")
+        self.failed += len(batch)
+
+    async def _run(self):
+        """
+        Consumer loop. Exits once stop() was requested and the queue is drained.
+        """
+        while not (self._stopping and self._queue.empty()):
+            if self._queue.qsize() < self.batch_size and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+
+            batch = self._drain()
+            if not batch:
+                continue
+            await self._flush_with_retry(batch)
+
+    def start(self):
+        """
+        Starts the background consumer.
+        """
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Flushes everything still queued, then stops the consumer.
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        """
+        Returns queue depth and ingestion counters.
+        """
+        return {
+            "queued": self._queue.qsize(),
+            "max_queue_size": self._queue.maxsize,
+            "writer": self.writer,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+# Process-wide click ingestion pipeline
+click_ingestor = ClickIngestor(
+    settings.CLICK_QUEUE_MAX_SIZE,
+    settings.CLICK_BATCH_SIZE,
+    settings.CLICK_FLUSH_INTERVAL_SECONDS,
+    settings.CLICK_WRITER,
+)
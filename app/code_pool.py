@@ -0,0 +1,145 @@
+# app/code_pool.py
+import asyncio
+from sqlalchemy import select
+from redis.asyncio import Redis
+from redis.exceptions import LockError
+from database import AsyncSessionLocal, URL
+from utils import generate_short_code
+from config import settings
+
+POOL_KEY = "shortcode:pool"
+REFILL_LOCK_KEY = "shortcode:pool:refill"
+
+class ShortCodePool:
+    """
+    Reservoir of pre-generated, verified-unused short codes kept in a Redis list.
+    create_short_url pops a code in O(1); a background refiller tops the list up to
+    target_size whenever it falls below low_water_mark, checking each generated batch
+    against urls with one set-based query.
+    """
+
+    def __init__(self, target_size: int, low_water_mark: int, batch_size: int, check_interval: float, session_factory=None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.target_size = target_size
+        self.low_water_mark = low_water_mark
+        self.batch_size = batch_size
+        self.check_interval = check_interval
+        self._task: asyncio.Task | None = None
+        self.pops = 0
+        self.empty_pops = 0
+        self.refills = 0
+        self.low_water_events = 0
+        self.codes_added = 0
+        self.codes_rejected = 0
+
+    async def pop(self, redis_client: Redis) -> str | None:
+        """
+        Takes one code from the pool, or returns None if the pool is empty.
+        """
+        short_code = await redis_client.lpop(POOL_KEY)
+        if short_code is None:
+            self.empty_pops += 1
+        else:
+            self.pops += 1
+        return short_code
+
+    async def pop_many(self, redis_client: Redis, count: int) -> list[str]:
+        """
+        Takes up to `count` codes from the pool in one call; may return fewer (or none).
+        """
+        codes = await redis_client.lpop(POOL_KEY, count) or []
+        self.pops += len(codes)
+        if len(codes) < count:
+            self.empty_pops += 1
+        return codes
+
+    async def refill(self, redis_client: Redis) -> int:
+        """
+        Tops the pool up to target_size if it is below the low-water mark.
+        Returns the number of codes added.
+        """
+        size = await redis_client.llen(POOL_KEY)
+        if size >= self.low_water_mark:
+            return 0
+        self.low_water_events += 1
+
+        added = 0
+        async with self.session_factory() as session:
+            while size + added < self.target_size:
+                count = min(self.batch_size, self.target_size - size - added)
+                candidates = {generate_short_code() for _ in range(count)}
+                taken = set(await session.scalars(
+                    select(URL.short_code).filter(URL.short_code.in_(candidates))
+                ))
+                fresh = list(candidates - taken)
+                self.codes_rejected += len(taken)
+                if fresh:
+                    await redis_client.rpush(POOL_KEY, *fresh)
+                    added += len(fresh)
+        self.refills += 1
+        self.codes_added += added
+        return added
+
+    async def _run(self, redis_client: Redis):
+        """
+        Refill loop. Only one worker refills at a time.
+        """
+        while True:
+            try:
+                lock = redis_client.lock(REFILL_LOCK_KEY, timeout=60)
+                if await lock.acquire(blocking=False):
+                    try:
+                        await self.refill(redis_client)
+                    finally:
+                        try:
+                            await lock.release()
+                        except LockError:
+                            pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Short code pool refill failed: {e}")
+            await asyncio.sleep(self.check_interval)
+
+    def start(self, redis_client: Redis):
+        """
+        Starts the background refiller.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(redis_client))
+
+    async def stop(self):
+        """
+        Cancels the background refiller.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def stats(self, redis_client: Redis) -> dict:
+        """
+        Returns the current pool size, low-water-mark breaches and this worker's counters.
+        """
+        return {
+            "size": await redis_client.llen(POOL_KEY),
+            "target_size": self.target_size,
+            "low_water_mark": self.low_water_mark,
+            "low_water_events": self.low_water_events,
+            "pops": self.pops,
+            "empty_pops": self.empty_pops,
+            "refills": self.refills,
+            "codes_added": self.codes_added,
+            "codes_rejected": self.codes_rejected,
+        }
+
+# Process-wide pool used when SHORT_CODE_STRATEGY is "pool"
+short_code_pool = ShortCodePool(
+    settings.CODE_POOL_TARGET_SIZE,
+    settings.CODE_POOL_LOW_WATER_MARK,
+    settings.CODE_POOL_BATCH_SIZE,
+    settings.CODE_POOL_CHECK_INTERVAL_SECONDS,
+)
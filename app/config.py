@@ -16,5 +16,101 @@ class Settings(BaseSettings):
     SHORT_CODE_LENGTH: int = 8
     RATE_LIMIT_PER_MINUTE: int = 10
 
+    # How short codes are generated: "random" (shortuuid, retried on conflict),
+    # "sequence" (block-leased IDs from a Postgres sequence, base62-encoded),
+    # "pool" (pre-verified random codes popped from a Redis list) or
+    # "snowflake" (region/worker/time/sequence IDs, unique without coordination)
+    SHORT_CODE_STRATEGY: str = "random"
+    ID_BLOCK_SIZE: int = 1000
+    # Non-empty key enables keyed scrambling of sequential codes
+    SHORT_CODE_SCRAMBLE_KEY: str = ""
+    CODE_POOL_TARGET_SIZE: int = 100000
+    CODE_POOL_LOW_WATER_MARK: int = 20000
+    CODE_POOL_BATCH_SIZE: int = 5000
+    CODE_POOL_CHECK_INTERVAL_SECONDS: float = 1.0
+    # Snowflake layout; timestamp bits are whatever SHORT_CODE_LENGTH leaves over
+    SNOWFLAKE_REGION_ID: int = 0
+    SNOWFLAKE_REGION_BITS: int = 4
+    SNOWFLAKE_WORKER_BITS: int = 4
+    SNOWFLAKE_SEQUENCE_BITS: int = 10
+    SNOWFLAKE_EPOCH_MS: int = 1767225600000 # 2026-01-01T00:00:00Z
+    SNOWFLAKE_TIME_UNIT_MS: int = 1000
+    # -1 claims a free worker ID on this node via file locks in SNOWFLAKE_LOCK_DIR
+    SNOWFLAKE_WORKER_ID: int = -1
+    SNOWFLAKE_LOCK_DIR: str = "/tmp"
+
+    # Return the existing short code when the same (canonicalized) long URL is shortened again
+    DEDUP_LONG_URLS: bool = False
+
+    # Maximum number of URLs accepted by POST /shorten/batch
+    SHORTEN_BATCH_MAX_ITEMS: int = 10000
+
+    # Maximum number of buckets returned by GET /analytics/{short_code}/timeseries
+    TIMESERIES_MAX_BUCKETS: int = 10000
+
+    # Maximum number of short codes accepted by POST /analytics/batch
+    ANALYTICS_BATCH_MAX_ITEMS: int = 1000
+
+    # Rows fetched per server-side cursor round trip by GET /analytics/{short_code}/clicks/export
+    CLICK_EXPORT_BATCH_SIZE: int = 5000
+
+    # In-process (L1) cache in front of Redis for redirect lookups
+    L1_CACHE_MAX_SIZE: int = 10000
+    L1_CACHE_TTL_SECONDS: float = 30.0
+    CACHE_INVALIDATION_CHANNEL: str = "url-cache-invalidate"
+
+    # Rejecting unknown short codes without touching Redis or the DB
+    NEGATIVE_CACHE_MAX_SIZE: int = 50000
+    NEGATIVE_CACHE_TTL_SECONDS: float = 10.0
+    BLOOM_CAPACITY: int = 1000000
+    BLOOM_ERROR_RATE: float = 0.01
+
+    # Popularity-aware TTLs for short:{code} records in Redis
+    CACHE_TTL_MIN_SECONDS: int = 3600
+    CACHE_TTL_MAX_SECONDS: int = 604800
+    CACHE_TTL_HITS_PER_DOUBLING: int = 10
+    CACHE_TTL_WINDOW_SECONDS: int = 3600
+
+    # Answer GET /{short_code} from a lean ASGI handler instead of the FastAPI route
+    FAST_REDIRECT_ENABLED: bool = True
+
+    # Batched click ingestion
+    CLICK_QUEUE_MAX_SIZE: int = 100000
+    CLICK_BATCH_SIZE: int = 500
+    CLICK_FLUSH_INTERVAL_SECONDS: float = 1.0
+    # How batches are written: "copy" (binary COPY via asyncpg) or "insert" (multi-row INSERT)
+    CLICK_WRITER: str = "copy"
+
+    # How often Redis click deltas are written back to urls.total_clicks
+    CLICK_COUNTER_FLUSH_INTERVAL_SECONDS: float = 5.0
+
+    # click_events partitioning: monthly partitions created ahead of time; whole partitions
+    # are dropped once older than CLICK_RETENTION_DAYS (0 keeps clicks forever)
+    CLICK_PARTITIONS_AHEAD_MONTHS: int = 3
+    CLICK_RETENTION_DAYS: int = 395
+    CLICK_PARTITION_CHECK_INTERVAL_SECONDS: float = 3600.0
+
+    # Optional Redis stream of raw clicks, appended by the redirect script
+    CLICK_STREAM_ENABLED: bool = False
+    CLICK_STREAM_KEY: str = "clicks:stream"
+    CLICK_STREAM_MAXLEN: int = 1000000
+
+    # Unique visitors: one HyperLogLog of client IPs per code per UTC day (hll:{code}:{yyyymmdd})
+    UNIQUE_VISITORS_RETENTION_DAYS: int = 400
+    UNIQUE_VISITORS_DEFAULT_DAYS: int = 30
+
+    # Trending links: decay time constant (seconds) of each window served by GET /analytics/trending
+    TRENDING_WINDOWS: dict[str, int] = {"5m": 300, "1h": 3600, "24h": 86400}
+    TRENDING_MAX_MEMBERS: int = 1000
+    TRENDING_ERA_WINDOWS: int = 20
+
+    # Redis rehydration after restarts or flushes
+    REHYDRATE_ON_STARTUP: bool = True
+    REHYDRATE_HOT_SET_SIZE: int = 10000
+    REHYDRATE_MAX_KEYS: int = 1000000
+    REHYDRATE_BATCH_SIZE: int = 5000
+    REHYDRATE_WINDOW_DAYS: int = 7
+    REHYDRATE_LOCK_TIMEOUT_SECONDS: int = 300
+
 settings = Settings()
 
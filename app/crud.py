@@ -1,95 +1,482 @@
 # app/crud.py
+import asyncio
+from datetime import datetime, date, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from database import URL, ClickEvent
-from schemas import URLCreate
-from utils import generate_short_code
+from sqlalchemy import select, func, bindparam
+from sqlalchemy.types import ARRAY, String, DateTime, LargeBinary
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database import URL
+from pydantic import ValidationError
+from schemas import URLCreate, URLResponse, CachedURL
+from utils import generate_short_code, cache_ttl, long_url_digest
 from redis.asyncio import Redis
 from config import settings
+from local_cache import url_cache, negative_cache, publish_invalidation
+from bloom import short_code_filter
+from click_ingest import click_ingestor
+from singleflight import SingleFlight
+from redis_scripts import resolve_and_count_click
+from trending import trending_script_args
+from click_counters import PENDING_CLICKS_KEY, unflushed_clicks
+from id_allocator import sequential_code_allocator, snowflake_code_generator
+from code_pool import short_code_pool
+from rollups import click_timeseries, bucket_start, GRANULARITY_STEPS
 
-async def create_short_url(db: AsyncSession, url: URLCreate, redis_client: Redis) -> URL:
+# Coalesces concurrent cache misses for the same short code within this worker
+url_fetches = SingleFlight()
+
+# Returned by get_cached_url_record when only the database can answer
+CACHE_MISS = object()
+
+async def _next_short_code(db: AsyncSession, redis_client: Redis) -> str:
+    """
+    Returns a short code that is not in use yet, according to SHORT_CODE_STRATEGY.
+    """
+    if settings.SHORT_CODE_STRATEGY == "sequence":
+        # Allocated codes are unique by construction; no existence check needed
+        return await sequential_code_allocator.next_code(db)
+
+    if settings.SHORT_CODE_STRATEGY == "snowflake":
+        return snowflake_code_generator().next_code()
+
+    if settings.SHORT_CODE_STRATEGY == "pool":
+        # Pooled codes were verified unused when generated; fall through if the pool ran dry
+        short_code = await short_code_pool.pop(redis_client)
+        if short_code:
+            return short_code
+
+    # Random codes are not checked up front; create_short_url retries on conflict
+    return generate_short_code()
+
+async def _cache_new_url(redis_client: Redis, short_code: str, record: CachedURL):
+    """
+    Caches a new record and broadcasts the invalidation in one pipelined round trip.
+    """
+    async with redis_client.pipeline(transaction=False) as pipe:
+        # New codes start with the cold TTL; clicks extend it (see cache_ttl)
+        pipe.setex(f"short:{short_code}", cache_ttl(0), record.model_dump_json())
+        # Drop any stale local entries and add the code to the Bloom filter on every worker
+        await publish_invalidation(pipe, short_code)
+        await pipe.execute()
+
+async def create_short_url(db: AsyncSession, url: URLCreate, redis_client: Redis) -> URLResponse:
     """
     Creates a new short URL entry in the database and caches it in Redis.
-    Generates a unique short code.
+    The row is written with a single INSERT ... ON CONFLICT DO NOTHING RETURNING;
+    a conflict means the code is taken, so a new one is drawn and the insert retried.
+    With DEDUP_LONG_URLS, a conflict on long_url_hash instead returns the existing URL.
+    The Redis cache write runs concurrently with the commit.
     """
+    long_url = str(url.long_url)
+    digest = long_url_digest(long_url) if settings.DEDUP_LONG_URLS else None
     while True:
-        short_code = generate_short_code()
-        # Check if the short code already exists in the database
-        existing_url = await db.scalar(select(URL).filter(URL.short_code == short_code))
-        if not existing_url:
-            break # Found a unique short code
-
-    db_url = URL(long_url=str(url.long_url), short_code=short_code)
-    db.add(db_url)
+        short_code = await _next_short_code(db, redis_client)
+        db_url = await db.scalar(
+            pg_insert(URL)
+            .values(short_code=short_code, long_url=long_url, long_url_hash=digest)
+            .on_conflict_do_nothing()
+            .returning(URL)
+        )
+        if db_url is not None:
+            break
+        if digest is not None:
+            existing_url = await db.scalar(select(URL).filter(URL.long_url_hash == digest))
+            if existing_url is not None:
+                # Same destination was shortened before; nothing new to commit or cache
+                return URLResponse.model_validate(existing_url)
+
+    # Build the response before commit() expires the instance, so no refresh SELECT is needed
+    response = URLResponse.model_validate(db_url)
+    record = CachedURL.model_validate(db_url)
+
+    commit_result, cache_result = await asyncio.gather(
+        db.commit(), _cache_new_url(redis_client, short_code, record), return_exceptions=True
+    )
+    if isinstance(commit_result, BaseException):
+        # Don't leave a cached record behind for a row that was never committed
+        await redis_client.delete(f"short:{short_code}")
+        raise commit_result
+    if isinstance(cache_result, BaseException):
+        # The record is filled from the DB on the first cache miss instead
+        print(f"Warning: Failed to cache new short code {short_code}: {cache_result}")
+
+    return response
+
+async def _next_short_codes(db: AsyncSession, redis_client: Redis, count: int) -> list[str]:
+    """
+    Bulk version of _next_short_code.
+    """
+    if settings.SHORT_CODE_STRATEGY == "sequence":
+        return [await sequential_code_allocator.next_code(db) for _ in range(count)]
+
+    if settings.SHORT_CODE_STRATEGY == "snowflake":
+        generator = snowflake_code_generator()
+        return [generator.next_code() for _ in range(count)]
+
+    short_codes = []
+    if settings.SHORT_CODE_STRATEGY == "pool":
+        short_codes = await short_code_pool.pop_many(redis_client, count)
+    short_codes.extend(generate_short_code() for _ in range(count - len(short_codes)))
+    return short_codes
+
+async def create_short_urls(db: AsyncSession, urls: list[URLCreate], redis_client: Redis) -> list[tuple[str, CachedURL, bool]]:
+    """
+    Creates many short URLs at once and returns (short_code, record, created) triples in input order;
+    created is False for URLs that resolved to an existing row through deduplication.
+    Each round inserts every pending URL with one INSERT ... SELECT unnest(...) ON CONFLICT
+    DO NOTHING RETURNING statement; URLs whose code was taken get new codes next round.
+    With DEDUP_LONG_URLS, URLs that already exist (or repeat within the batch) resolve to
+    the existing row, found with one IN query per round.
+    Newly created records are then cached with a single Redis pipeline.
+    """
+    long_urls = [str(url.long_url) for url in urls]
+    if settings.DEDUP_LONG_URLS:
+        digests = [long_url_digest(long_url) for long_url in long_urls]
+    else:
+        digests = [None] * len(urls)
+    results: list[CachedURL | None] = [None] * len(urls)
+    short_codes: list[str | None] = [None] * len(urls)
+    created: set[int] = set()
+    pending = list(range(len(urls)))
+
+    while pending:
+        codes = await _next_short_codes(db, redis_client, len(pending))
+        by_code = {}
+        for index, code in zip(pending, codes):
+            by_code.setdefault(code, index)
+        now = datetime.utcnow()
+        rows = select(
+            func.unnest(bindparam("codes", list(by_code), type_=ARRAY(String))),
+            func.unnest(bindparam("urls", [long_urls[i] for i in by_code.values()], type_=ARRAY(String))),
+            func.unnest(bindparam("times", [now] * len(by_code), type_=ARRAY(DateTime))),
+            func.unnest(bindparam("hashes", [digests[i] for i in by_code.values()], type_=ARRAY(LargeBinary))),
+        )
+        inserted = await db.execute(
+            pg_insert(URL)
+            .from_select(["short_code", "long_url", "created_at", "long_url_hash"], rows)
+            .on_conflict_do_nothing()
+            .returning(URL.id, URL.short_code, URL.long_url, URL.created_at)
+        )
+        for row in inserted:
+            index = by_code[row.short_code]
+            results[index] = CachedURL(id=row.id, long_url=row.long_url, created_at=row.created_at)
+            short_codes[index] = row.short_code
+            created.add(index)
+        pending = [index for index in pending if results[index] is None]
+
+        if pending and settings.DEDUP_LONG_URLS:
+            existing = await db.execute(
+                select(URL.id, URL.short_code, URL.long_url, URL.created_at, URL.long_url_hash)
+                .filter(URL.long_url_hash.in_({digests[i] for i in pending}))
+            )
+            by_digest = {row.long_url_hash: row for row in existing}
+            for index in pending:
+                row = by_digest.get(digests[index])
+                if row is not None:
+                    results[index] = CachedURL(id=row.id, long_url=row.long_url, created_at=row.created_at)
+                    short_codes[index] = row.short_code
+            pending = [index for index in pending if results[index] is None]
+
     await db.commit()
-    await db.refresh(db_url)
 
-    # Cache the short_code to long_url mapping in Redis
-    # Set an expiration for the cache entry (e.g., 24 hours)
-    await redis_client.setex(f"short:{short_code}", 86400, str(url.long_url))
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for index in created:
+            short_code, record = short_codes[index], results[index]
+            pipe.setex(f"short:{short_code}", cache_ttl(0), record.model_dump_json())
+            await publish_invalidation(pipe, short_code)
+        await pipe.execute()
 
-    return db_url
+    return [(short_codes[i], results[i], i in created) for i in range(len(urls))]
 
-async def get_long_url(db: AsyncSession, short_code: str, redis_client: Redis) -> str | None:
+def _parse_cached_url(raw: str) -> CachedURL | None:
     """
-    Retrieves the original long URL given a short code.
-    Prioritizes fetching from Redis cache. If not found, fetches from DB and caches.
+    Decodes a short:{code} value from Redis.
+    Returns None for entries that are not a CachedURL record (e.g. plain long_url
+    strings written before the record format), so they are refreshed from the DB.
+    """
+    try:
+        return CachedURL.model_validate_json(raw)
+    except ValidationError:
+        return None
+
+def lookup_local(short_code: str) -> CachedURL | None | object:
+    """
+    Resolves a short code from in-process state only: the L1 cache, the negative
+    cache and the short code Bloom filter. Returns CACHE_MISS if Redis must be asked.
+    """
+    # Try the in-process cache first; a hit costs no network round trip
+    record = url_cache.get(short_code)
+    if record:
+        return record
+
+    # Reject codes that recently missed, or that were never issued
+    if negative_cache.get(short_code):
+        return None
+    if not short_code_filter.might_contain(short_code):
+        negative_cache.set(short_code, True)
+        return None
+    return CACHE_MISS
+
+async def get_cached_url_record(short_code: str, redis_client: Redis) -> CachedURL | None | object:
+    """
+    Resolves a short code from the in-process caches and Redis only.
+    Returns the record, None if the code is known not to exist, or
+    CACHE_MISS if the database has to be consulted.
+    """
+    record = lookup_local(short_code)
+    if record is not CACHE_MISS:
+        return record
+
+    # Then try the Redis cache
+    cached = await redis_client.get(f"short:{short_code}")
+    if cached:
+        record = _parse_cached_url(cached)
+        if record:
+            url_cache.set(short_code, record)
+            return record
+    return CACHE_MISS
+
+def unique_visitors_key(short_code: str, day: date) -> str:
+    """
+    Redis key of the HyperLogLog of visitor IPs for one code on one UTC day.
+    """
+    return f"hll:{short_code}:{day:%Y%m%d}"
+
+def _visitor_days(visitors_from: date | None, visitors_to: date | None) -> tuple[date, date]:
+    """
+    Fills in the default unique visitor range: the last UNIQUE_VISITORS_DEFAULT_DAYS days, including today.
+    """
+    visitors_to = visitors_to or datetime.utcnow().date()
+    visitors_from = visitors_from or visitors_to - timedelta(days=settings.UNIQUE_VISITORS_DEFAULT_DAYS - 1)
+    return visitors_from, visitors_to
+
+def _unique_visitors_keys(short_code: str, start: date, end: date) -> list[str]:
     """
-    # Try to get from Redis cache first
-    long_url = await redis_client.get(f"short:{short_code}")
-    if long_url:
-        return long_url
+    HyperLogLog keys for the UTC days [start, end], inclusive.
+    Days older than the HyperLogLog retention have expired and are skipped.
+    """
+    start = max(start, datetime.utcnow().date() - timedelta(days=settings.UNIQUE_VISITORS_RETENTION_DAYS - 1))
+    return [unique_visitors_key(short_code, start + timedelta(days=offset)) for offset in range((end - start).days + 1)]
+
+async def count_unique_visitors(redis_client: Redis, short_code: str, start: date, end: date) -> int:
+    """
+    Approximate distinct visitors over the UTC days [start, end], inclusive.
+    PFCOUNT over several keys merges their HyperLogLogs on the fly (about 0.81% standard error).
+    """
+    keys = _unique_visitors_keys(short_code, start, end)
+    return await redis_client.pfcount(*keys) if keys else 0
+
+def _click_script_args(fetch: bool, short_code: str, ip_address: str | None) -> dict:
+    """
+    Builds keys and args for the resolve_and_count_click Redis script.
+    """
+    trending_keys, trending_args = trending_script_args()
+    return {
+        "keys": [
+            f"short:{short_code}",
+            settings.CLICK_STREAM_KEY,
+            f"hits:{short_code}",
+            unique_visitors_key(short_code, datetime.utcnow().date()),
+            PENDING_CLICKS_KEY,
+            *trending_keys,
+        ],
+        "args": [
+            "1" if fetch else "0",
+            settings.CLICK_STREAM_MAXLEN if settings.CLICK_STREAM_ENABLED else 0,
+            short_code,
+            ip_address or "",
+            settings.CACHE_TTL_MIN_SECONDS,
+            settings.CACHE_TTL_MAX_SECONDS,
+            settings.CACHE_TTL_HITS_PER_DOUBLING,
+            settings.CACHE_TTL_WINDOW_SECONDS,
+            settings.UNIQUE_VISITORS_RETENTION_DAYS * 86400,
+            settings.TRENDING_MAX_MEMBERS,
+            *trending_args,
+        ],
+    }
+
+async def fetch_and_record_click(short_code: str, ip_address: str | None, redis_client: Redis) -> CachedURL | object:
+    """
+    Fetches a record that missed L1 from Redis and records the click in the same script call.
+    Returns CACHE_MISS if the database has to be consulted, in which case no click has been recorded yet.
+    """
+    cached = await resolve_and_count_click(
+        **_click_script_args(True, short_code, ip_address), client=redis_client
+    )
+    record = _parse_cached_url(cached) if cached else None
+    if record is None:
+        return CACHE_MISS
+    url_cache.set(short_code, record)
+    click_ingestor.submit(record.id, ip_address)
+    return record
 
-    # If not in cache, fetch from database
+async def resolve_and_record_click(short_code: str, ip_address: str | None, redis_client: Redis) -> CachedURL | None | object:
+    """
+    Redirect hot path: resolves a short code and records the click with at most one Redis call.
+    On an L1 hit the script only counts the click; otherwise it also fetches the record.
+    Returns the record, None if the code is known not to exist, or CACHE_MISS if the
+    database has to be consulted, in which case no click has been recorded yet.
+    """
+    record = lookup_local(short_code)
+    if record is None:
+        return None
+    if record is CACHE_MISS:
+        return await fetch_and_record_click(short_code, ip_address, redis_client)
+    await record_click(record.id, short_code, ip_address, redis_client)
+    return record
+
+async def get_url_record(db: AsyncSession, short_code: str, redis_client: Redis) -> CachedURL | None:
+    """
+    Retrieves the cached record (id, long_url, created_at) for a short code.
+    Checks the in-process L1 cache, then Redis, then the DB, filling the faster tiers on the way back.
+    Codes that are known not to exist are rejected in memory before Redis is queried.
+    """
+    record = await get_cached_url_record(short_code, redis_client)
+    if record is not CACHE_MISS:
+        return record
+    return await load_url_record(db, short_code, redis_client)
+
+async def load_url_record(db: AsyncSession, short_code: str, redis_client: Redis) -> CachedURL | None:
+    """
+    Resolves a short code that missed every cache tier from the database.
+    Concurrent misses for the same code share one fetch.
+    """
+    return await url_fetches.do(short_code, lambda: _load_url_record(db, short_code, redis_client))
+
+async def _load_url_record(db: AsyncSession, short_code: str, redis_client: Redis) -> CachedURL | None:
+    """
+    Fetches a short code from the database and fills the Redis, L1 and negative caches.
+    """
     db_url = await db.scalar(select(URL).filter(URL.short_code == short_code))
     if db_url:
-        # Cache the result in Redis for future requests
-        await redis_client.setex(f"short:{short_code}", 86400, db_url.long_url)
-        return db_url.long_url
+        record = CachedURL.model_validate(db_url)
+        # Cache the result in Redis with the cold TTL; clicks extend it (see cache_ttl)
+        await redis_client.setex(f"short:{short_code}", cache_ttl(0), record.model_dump_json())
+        url_cache.set(short_code, record)
+        return record
+    negative_cache.set(short_code, True)
     return None
 
-async def record_click(db: AsyncSession, short_code: str, ip_address: str | None, redis_client: Redis):
+async def get_long_url(db: AsyncSession, short_code: str, redis_client: Redis) -> str | None:
     """
-    Records a click event for a short URL in the database and increments Redis counter.
+    Retrieves the original long URL given a short code.
     """
-    db_url = await db.scalar(select(URL).filter(URL.short_code == short_code))
-    if db_url:
-        click_event = ClickEvent(short_code_id=db_url.id, ip_address=ip_address)
-        db.add(click_event)
-        await db.commit()
+    record = await get_url_record(db, short_code, redis_client)
+    return record.long_url if record else None
 
-        # Increment click counter in Redis
-        await redis_client.incr(f"clicks:{short_code}")
-    else:
-        # Handle case where short code doesn't exist (e.g., log an error)
-        print(f"Warning: Attempted to record click for non-existent short code: {short_code}")
+async def record_click(url_id: int, short_code: str, ip_address: str | None, redis_client: Redis):
+    """
+    Records a click event for a short URL and counts it in the pending write-back hash in Redis.
+    url_id comes from the cached record resolved by get_url_record, so no lookup is needed.
+    The click_events row is queued and written in batches by the click ingestor,
+    so the redirect never waits on the database.
+    """
+    click_ingestor.submit(url_id, ip_address)
+
+    # Count the click for write-back to urls.total_clicks (and append to the click stream, if enabled)
+    await resolve_and_count_click(**_click_script_args(False, short_code, ip_address), client=redis_client)
 
 
-async def get_url_analytics(db: AsyncSession, short_code: str, redis_client: Redis) -> dict | None:
+async def get_url_analytics(
+    db: AsyncSession, short_code: str, redis_client: Redis,
+    visitors_from: date | None = None, visitors_to: date | None = None
+) -> dict | None:
     """
-    Retrieves analytics for a given short URL, including total clicks.
-    Fetches total clicks from Redis, and URL details from the database.
+    Retrieves analytics for a given short URL, including total clicks and unique visitors.
+    Total clicks are the durable urls.total_clicks plus clicks counted in Redis but not yet
+    written back, so losing Redis only loses those unflushed clicks.
+    The Redis deltas are read before the row: a write-back committing in between then
+    counts its clicks twice (see unflushed_clicks) rather than not at all, and that
+    double count is the only error.
+    Unique visitors default to the last UNIQUE_VISITORS_DEFAULT_DAYS days, including today.
     """
-    db_url = await db.scalar(select(URL).filter(URL.short_code == short_code))
+    [unflushed] = await unflushed_clicks(redis_client, [short_code])
+    # Plain columns rather than the entity, so a reused session never serves a stale total_clicks
+    result = await db.execute(
+        select(URL.short_code, URL.long_url, URL.created_at, URL.total_clicks).filter(URL.short_code == short_code)
+    )
+    db_url = result.first()
     if db_url:
-        # Get total clicks from Redis
-        total_clicks = await redis_client.get(f"clicks:{short_code}")
-        if total_clicks is None:
-            # If Redis counter is not present, aggregate from DB (initial sync or Redis restart)
-            db_clicks = await db.scalar(
-                select(func.count(ClickEvent.id)).filter(ClickEvent.short_code_id == db_url.id)
-            )
-            total_clicks = db_clicks if db_clicks is not None else 0
-            # Optionally, set this value back to Redis for future consistency
-            await redis_client.set(f"clicks:{short_code}", total_clicks)
-        else:
-            total_clicks = int(total_clicks)
+        total_clicks = db_url.total_clicks + unflushed
+
+        visitors_from, visitors_to = _visitor_days(visitors_from, visitors_to)
+        unique_visitors = await count_unique_visitors(redis_client, short_code, visitors_from, visitors_to)
 
         return {
             "short_code": db_url.short_code,
             "long_url": db_url.long_url,
             "created_at": db_url.created_at,
-            "total_clicks": total_clicks
+            "total_clicks": total_clicks,
+            "unique_visitors": unique_visitors,
         }
     return None
 
+
+async def get_url_analytics_batch(
+    db: AsyncSession, short_codes: list[str], redis_client: Redis,
+    visitors_from: date | None = None, visitors_to: date | None = None
+) -> list[dict]:
+    """
+    Retrieves analytics for many short URLs at once, in the order given; unknown codes are left out.
+    Uses two Redis round trips for unflushed clicks, read before the rows as in
+    get_url_analytics, one IN query for URL details and one pipelined round trip
+    for unique visitors.
+    """
+    short_codes = list(dict.fromkeys(short_codes))
+    if not short_codes:
+        return []
+    unflushed = dict(zip(short_codes, await unflushed_clicks(redis_client, short_codes)))
+    result = await db.execute(
+        select(URL.short_code, URL.long_url, URL.created_at, URL.total_clicks).filter(URL.short_code.in_(short_codes))
+    )
+    urls = {row.short_code: row for row in result}
+    found = [code for code in short_codes if code in urls]
+    if not found:
+        return []
+
+    total_clicks = {code: urls[code].total_clicks + unflushed[code] for code in found}
+
+    visitors_from, visitors_to = _visitor_days(visitors_from, visitors_to)
+    visitor_keys = [_unique_visitors_keys(code, visitors_from, visitors_to) for code in found]
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for keys in visitor_keys:
+            if keys:
+                pipe.pfcount(*keys)
+        replies = await pipe.execute()
+    unique_visitors = replies if replies else [0] * len(found)
+
+    return [
+        {
+            "short_code": code,
+            "long_url": urls[code].long_url,
+            "created_at": urls[code].created_at,
+            "total_clicks": total_clicks[code],
+            "unique_visitors": visitors,
+        }
+        for code, visitors in zip(found, unique_visitors)
+    ]
+
+async def get_url_timeseries(
+    db: AsyncSession, short_code: str, start: datetime, end: datetime, granularity: str
+) -> dict | None:
+    """
+    Retrieves clicks per bucket for a given short URL from the rollup tables.
+    `start` is rounded down to its bucket; `end` is exclusive.
+    """
+    url_id = await get_url_id(db, short_code)
+    if url_id is None:
+        return None
+    start = bucket_start(start, granularity)
+    return {
+        "short_code": short_code,
+        "granularity": granularity,
+        "start": start,
+        "step_seconds": int(GRANULARITY_STEPS[granularity].total_seconds()),
+        "counts": await click_timeseries(db, url_id, start, end, granularity),
+    }
+
+async def get_url_id(db: AsyncSession, short_code: str) -> int | None:
+    """
+    Retrieves the ID of a short URL, or None if it does not exist.
+    """
+    return await db.scalar(select(URL.id).filter(URL.short_code == short_code))
@@ -1,7 +1,7 @@
 # app/database.py
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, LargeBinary, Sequence, Index, DDL, event, func, text
 from datetime import datetime
 import asyncio
 from config import settings
@@ -19,19 +19,80 @@ class URL(Base):
     short_code = Column(String, unique=True, index=True, nullable=False)
     long_url = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # SHA-256 of the canonical long_url; only set when DEDUP_LONG_URLS is on
+    long_url_hash = Column(LargeBinary(32), unique=True, index=True, nullable=True)
+    # Durable click counter, updated in bulk from Redis by click_counters.py
+    total_clicks = Column(BigInteger, nullable=False, default=0, server_default="0")
     # user_id can be added here if authentication is implemented
 
+# Source of integer IDs for sequentially allocated short codes (see id_allocator.py)
+short_code_id_seq = Sequence("short_code_id_seq", metadata=Base.metadata)
+
 class ClickEvent(Base):
     """
     SQLAlchemy model for storing click events for short URLs.
+    The table is range-partitioned by timestamp (one partition per month, see partitions.py),
+    so the partition key is part of the primary key.
     """
     __tablename__ = "click_events"
+    __table_args__ = (
+        Index("ix_click_events_short_code_id_timestamp", "short_code_id", "timestamp"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
     short_code_id = Column(Integer, ForeignKey("urls.id"), nullable=False)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, primary_key=True, nullable=False, default=datetime.utcnow)
     ip_address = Column(String, nullable=True) # Store IP for basic analytics
 
+class ClickCounterFlush(Base):
+    """
+    SQLAlchemy model recording which click counter write-backs have been applied,
+    so a flush retried after a crash is never added to urls.total_clicks twice.
+    """
+    __tablename__ = "click_counter_flushes"
+
+    flush_id = Column(String, primary_key=True)
+    flushed_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+# Catches clicks outside the monthly partitions, so inserts never fail before
+# partitions.py has created them (e.g. on a freshly created test database)
+event.listen(
+    ClickEvent.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS click_events_default PARTITION OF click_events DEFAULT"),
+)
+
+class ClickRollupMinute(Base):
+    """
+    SQLAlchemy model for per-minute click counts, maintained incrementally by the click ingestor.
+    """
+    __tablename__ = "click_rollups_minute"
+
+    short_code_id = Column(Integer, ForeignKey("urls.id"), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    clicks = Column(BigInteger, nullable=False, default=0)
+
+class ClickRollupHour(Base):
+    """
+    SQLAlchemy model for per-hour click counts, maintained incrementally by the click ingestor.
+    """
+    __tablename__ = "click_rollups_hour"
+
+    short_code_id = Column(Integer, ForeignKey("urls.id"), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    clicks = Column(BigInteger, nullable=False, default=0)
+
+class ClickRollupDay(Base):
+    """
+    SQLAlchemy model for per-day click counts, maintained incrementally by the click ingestor.
+    """
+    __tablename__ = "click_rollups_day"
+
+    short_code_id = Column(Integer, ForeignKey("urls.id"), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    clicks = Column(BigInteger, nullable=False, default=0)
+
 # Create an async engine
 engine = create_async_engine(settings.DATABASE_URL, echo=True)
 
@@ -43,6 +104,29 @@ AsyncSessionLocal = async_sessionmaker(
     class_=AsyncSession
 )
 
+# Idempotent DDL for columns and indexes added after a table was first created;
+# create_all() only creates missing tables, it never alters existing ones.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE urls ADD COLUMN IF NOT EXISTS long_url_hash BYTEA",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_urls_long_url_hash ON urls (long_url_hash)",
+    # Adding total_clicks to an existing table also backfills it from click_events, once:
+    # later runs find the column and skip the full count
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'urls' AND column_name = 'total_clicks'
+        ) THEN
+            ALTER TABLE urls ADD COLUMN total_clicks BIGINT NOT NULL DEFAULT 0;
+            UPDATE urls SET total_clicks = counts.clicks
+            FROM (SELECT short_code_id, count(*) AS clicks FROM click_events GROUP BY short_code_id) AS counts
+            WHERE urls.id = counts.short_code_id;
+        END IF;
+    END $$
+    """,
+]
+
 async def init_db():
     """
     Initializes the database by creating all tables.
@@ -56,6 +140,8 @@ async def init_db():
             print(f"Attempting to connect to database and create tables (Attempt {i+1}/{MAX_RETRIES})...")
             async with engine.begin() as conn:
                 await conn.run_sync(Base.metadata.create_all)
+                for statement in SCHEMA_UPGRADES:
+                    await conn.execute(text(statement))
             print("Database tables created successfully.")
             return # Exit function if successful
         except Exception as e:
@@ -67,11 +153,55 @@ async def init_db():
                 print("Max retries reached. Could not connect to database.")
                 raise # Re-raise the last exception if all retries fail
 
+class LazySession:
+    """
+    Stand-in for an AsyncSession that creates the real session on first use.
+    Requests that never touch the database (e.g. redirects served from cache)
+    never create a session or take a connection from the pool.
+    """
+
+    def __init__(self, session_factory=None):
+        self._session_factory = session_factory or AsyncSessionLocal
+        self._session: AsyncSession | None = None
+
+    @property
+    def session(self) -> AsyncSession:
+        """
+        The underlying AsyncSession, created on first access.
+        """
+        if self._session is None:
+            self._session = self._session_factory()
+        return self._session
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    async def close(self):
+        """
+        Closes the underlying session, if one was ever created.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
 async def get_db():
     """
     Dependency for FastAPI to get an async database session.
-    Ensures the session is closed after the request.
+    The session is created lazily on first use and closed after the request.
     """
-    async with AsyncSessionLocal() as session:
+    session = LazySession()
+    try:
         yield session
+    finally:
+        await session.close()
 
+def get_session_factory():
+    """
+    Dependency for FastAPI to get the session factory, for responses that open
+    their own sessions because they outlive the request (streamed exports).
+    """
+    return AsyncSessionLocal
@@ -0,0 +1,137 @@
+# app/fast_redirect.py
+import inspect
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from urllib.parse import quote
+from database import get_db
+from redis_client import redis_client as default_redis_client, get_redis_client
+from config import settings
+import crud
+
+# Prebuilt response pieces; only the Location header varies per redirect
+_REDIRECT_HEADERS = [(b"content-length", b"0")]
+_NOT_FOUND_BODY = b'{"detail":"Short URL not found"}'
+_NOT_FOUND_START = {
+    "type": "http.response.start",
+    "status": 404,
+    "headers": [
+        (b"content-length", str(len(_NOT_FOUND_BODY)).encode()),
+        (b"content-type", b"application/json"),
+    ],
+}
+_NOT_FOUND_BODY_MESSAGE = {"type": "http.response.body", "body": _NOT_FOUND_BODY}
+_EMPTY_BODY_MESSAGE = {"type": "http.response.body", "body": b""}
+
+@lru_cache(maxsize=settings.L1_CACHE_MAX_SIZE)
+def _location_header(long_url: str) -> bytes:
+    """
+    Encodes a Location header value exactly like Starlette's RedirectResponse.
+    """
+    return quote(long_url, safe=":/%#?=@[]!$&'()*+,;").encode("latin-1")
+
+def _client_ip(scope) -> str | None:
+    """
+    Scope-level equivalent of main.get_client_ip.
+    """
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for":
+            return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else None
+
+class FastRedirectMiddleware:
+    """
+    ASGI middleware that answers GET /{short_code} without FastAPI routing,
+    dependency resolution or response classes. It has the same 307/404 semantics
+    as the redirect_to_long_url route, which still serves requests when it is disabled.
+
+    On an L1 hit the 307 is sent before the click is counted in Redis, so the
+    client never waits on a network round trip. A DB session is opened only when
+    every cache tier misses. Dependency overrides
+    on the FastAPI app (e.g. in tests) are honoured for get_db and get_redis_client.
+    All other requests, including paths of registered static routes, pass through.
+    """
+
+    def __init__(self, app, fastapi_app, enabled: bool = True):
+        self.app = app
+        self.fastapi_app = fastapi_app
+        self.enabled = enabled
+        self._reserved_paths: set[str] | None = None
+
+    def _is_redirect_path(self, path: str) -> bool:
+        if len(path) < 2 or path.find("/", 1) != -1:
+            return False
+        if self._reserved_paths is None:
+            self._reserved_paths = {
+                route.path for route in self.fastapi_app.routes if "{" not in route.path
+            }
+        return path not in self._reserved_paths
+
+    @asynccontextmanager
+    async def _dependency(self, dependency, default=None):
+        """
+        Resolves a dependency the way FastAPI would, honouring overrides.
+        If it is not overridden and a default is given, the default is used as-is.
+        """
+        provider = self.fastapi_app.dependency_overrides.get(dependency)
+        if provider is None:
+            if default is not None:
+                yield default
+                return
+            provider = dependency
+        value = provider()
+        if inspect.isasyncgen(value):
+            try:
+                yield await value.__anext__()
+            finally:
+                await value.aclose()
+        elif inspect.isgenerator(value):
+            try:
+                yield next(value)
+            finally:
+                value.close()
+        else:
+            yield await value if inspect.isawaitable(value) else value
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not self.enabled
+            or scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not self._is_redirect_path(scope["path"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        short_code = scope["path"][1:]
+        ip_address = _client_ip(scope)
+        record = crud.lookup_local(short_code)
+        if record is not None and record is not crud.CACHE_MISS:
+            # L1 hit: the client does not wait for the click to be counted
+            await self._send_redirect(send, record)
+            async with self._dependency(get_redis_client, default_redis_client) as redis_client:
+                await crud.record_click(record.id, short_code, ip_address, redis_client)
+            return
+
+        if record is crud.CACHE_MISS:
+            async with self._dependency(get_redis_client, default_redis_client) as redis_client:
+                record = await crud.fetch_and_record_click(short_code, ip_address, redis_client)
+                if record is crud.CACHE_MISS:
+                    async with self._dependency(get_db) as db:
+                        record = await crud.load_url_record(db, short_code, redis_client)
+                    if record is not None:
+                        await crud.record_click(record.id, short_code, ip_address, redis_client)
+
+        if record is None:
+            await send(_NOT_FOUND_START)
+            await send(_NOT_FOUND_BODY_MESSAGE)
+            return
+        await self._send_redirect(send, record)
+
+    async def _send_redirect(self, send, record):
+        await send({
+            "type": "http.response.start",
+            "status": 307,
+            "headers": [(b"location", _location_header(record.long_url)), *_REDIRECT_HEADERS],
+        })
+        await send(_EMPTY_BODY_MESSAGE)
@@ -0,0 +1,181 @@
+# app/id_allocator.py
+import asyncio
+import fcntl
+import math
+import os
+import time
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import short_code_id_seq
+from utils import encode_base62, scramble_id
+from config import settings
+
+class BlockIdAllocator:
+    """
+    Hands out integer IDs from blocks leased from the short_code_id_seq Postgres sequence.
+    One round trip leases a whole block, so most allocations need no DB access.
+    IDs are unique across workers and restarts; unused IDs of a block are simply skipped.
+    """
+
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self._ids: list[int] = []
+        self._lock = asyncio.Lock()
+        self.blocks_leased = 0
+
+    async def _lease_block(self, db: AsyncSession):
+        """
+        Takes block_size values from the sequence in a single statement.
+        """
+        result = await db.scalars(
+            select(short_code_id_seq.next_value()).select_from(func.generate_series(1, self.block_size))
+        )
+        # Pop from the end, so hand IDs out in ascending order
+        self._ids = sorted(result.all(), reverse=True)
+        self.blocks_leased += 1
+
+    async def next_id(self, db: AsyncSession) -> int:
+        async with self._lock:
+            if not self._ids:
+                await self._lease_block(db)
+            return self._ids.pop()
+
+    def stats(self) -> dict:
+        return {"remaining_in_block": len(self._ids), "blocks_leased": self.blocks_leased}
+
+class SequentialCodeAllocator:
+    """
+    Turns leased IDs into short codes of length SHORT_CODE_LENGTH: base62, optionally
+    passed through a keyed bijection (SHORT_CODE_SCRAMBLE_KEY) so codes are not guessable.
+    Codes are collision-free by construction, so no existence check is needed.
+    """
+
+    def __init__(self, id_allocator: BlockIdAllocator, length: int, scramble_key: str):
+        self.id_allocator = id_allocator
+        self.length = length
+        self.scramble_key = scramble_key
+
+    def encode(self, number: int) -> str:
+        if self.scramble_key:
+            number = scramble_id(number, self.length, self.scramble_key)
+        return encode_base62(number, self.length)
+
+    async def next_code(self, db: AsyncSession) -> str:
+        return self.encode(await self.id_allocator.next_id(db))
+
+# Process-wide allocator used when SHORT_CODE_STRATEGY is "sequence"
+sequential_code_allocator = SequentialCodeAllocator(
+    BlockIdAllocator(settings.ID_BLOCK_SIZE),
+    settings.SHORT_CODE_LENGTH,
+    settings.SHORT_CODE_SCRAMBLE_KEY,
+)
+
+class SnowflakeCodeGenerator:
+    """
+    Coordination-free, time-ordered code generator for multi-node deployments.
+    Each ID packs [region | worker | timestamp | sequence] into the bits that fit in a
+    base62 code of `length` characters (47 bits for 8 characters), so:
+      - codes never collide across regions (region bits) or workers on one node (worker bits),
+      - codes from one region share a prefix, and within a worker they increase with time,
+        so inserts append to the short_code B-tree instead of landing on random pages.
+    Workers on a node claim distinct worker IDs with local file locks unless one is configured.
+    If the sequence for the current time unit runs out, the next unit is borrowed.
+    """
+
+    def __init__(
+        self,
+        length: int,
+        region_id: int,
+        region_bits: int,
+        worker_bits: int,
+        sequence_bits: int,
+        epoch_ms: int,
+        time_unit_ms: int,
+        worker_id: int | None = None,
+        lock_dir: str = "/tmp",
+    ):
+        self.length = length
+        self.region_id = region_id
+        self.worker_bits = worker_bits
+        self.sequence_bits = sequence_bits
+        self.timestamp_bits = int(length * math.log2(62)) - region_bits - worker_bits - sequence_bits
+        if self.timestamp_bits < 24:
+            raise ValueError(
+                f"Only {self.timestamp_bits} timestamp bits left for {length}-character codes; "
+                "use longer codes or fewer region/worker/sequence bits"
+            )
+        if not 0 <= region_id < 1 << region_bits:
+            raise ValueError(f"Region ID {region_id} does not fit in {region_bits} bits")
+        self.epoch_ms = epoch_ms
+        self.time_unit_ms = time_unit_ms
+        self.lock_dir = lock_dir
+        self._worker_id = worker_id
+        self._lock_file = None
+        self._last_tick = -1
+        self._sequence = 0
+        self.borrowed_ticks = 0
+
+    @property
+    def worker_id(self) -> int:
+        if self._worker_id is None:
+            self._worker_id = self._claim_worker_id()
+        return self._worker_id
+
+    def _claim_worker_id(self) -> int:
+        """
+        Claims the first free worker slot on this node by taking an exclusive file lock.
+        The lock is held for the life of the process.
+        """
+        for candidate in range(1 << self.worker_bits):
+            path = os.path.join(self.lock_dir, f"snowflake-region{self.region_id}-worker{candidate}.lock")
+            lock_file = open(path, "w")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                continue
+            self._lock_file = lock_file
+            return candidate
+        raise RuntimeError(f"All {1 << self.worker_bits} snowflake worker IDs on this node are taken")
+
+    def next_id(self) -> int:
+        now = (time.time_ns() // 1_000_000 - self.epoch_ms) // self.time_unit_ms
+        if now > self._last_tick:
+            self._last_tick, self._sequence = now, 0
+        else:
+            # Same tick, or the clock went backwards: never reuse an earlier tick
+            self._sequence += 1
+            if self._sequence >= 1 << self.sequence_bits:
+                self._last_tick += 1
+                self._sequence = 0
+                self.borrowed_ticks += 1
+        if not 0 <= self._last_tick < 1 << self.timestamp_bits:
+            raise RuntimeError("Snowflake timestamp is outside the range covered by SNOWFLAKE_EPOCH_MS")
+
+        node = (self.region_id << self.worker_bits) | self.worker_id
+        return (((node << self.timestamp_bits) | self._last_tick) << self.sequence_bits) | self._sequence
+
+    def next_code(self) -> str:
+        return encode_base62(self.next_id(), self.length)
+
+_snowflake_generator: SnowflakeCodeGenerator | None = None
+
+def snowflake_code_generator() -> SnowflakeCodeGenerator:
+    """
+    Returns the process-wide generator used when SHORT_CODE_STRATEGY is "snowflake",
+    creating it (and validating its settings) on first use.
+    """
+    global _snowflake_generator
+    if _snowflake_generator is None:
+        _snowflake_generator = SnowflakeCodeGenerator(
+            settings.SHORT_CODE_LENGTH,
+            settings.SNOWFLAKE_REGION_ID,
+            settings.SNOWFLAKE_REGION_BITS,
+            settings.SNOWFLAKE_WORKER_BITS,
+            settings.SNOWFLAKE_SEQUENCE_BITS,
+            settings.SNOWFLAKE_EPOCH_MS,
+            settings.SNOWFLAKE_TIME_UNIT_MS,
+            worker_id=settings.SNOWFLAKE_WORKER_ID if settings.SNOWFLAKE_WORKER_ID >= 0 else None,
+            lock_dir=settings.SNOWFLAKE_LOCK_DIR,
+        )
+    return _snowflake_generator
@@ -0,0 +1,170 @@
+# app/local_cache.py
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any
+from redis.asyncio import Redis
+from config import settings
+from bloom import short_code_filter
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache with a per-entry TTL.
+    Sits in front of Redis so hot redirects are answered without a network hop.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Any | None:
+        """
+        Returns the cached value, or None if the key is absent or expired.
+        A hit moves the key to the most-recently-used position.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Stores a value, evicting the least-recently-used entries when full.
+        """
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        """
+        Drops a single key if present.
+        """
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        """
+        Drops every entry. Counters are kept.
+        """
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns the current size and hit/miss/eviction counters.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+# Process-wide L1 cache for short_code -> cached URL records
+url_cache = LocalCache(settings.L1_CACHE_MAX_SIZE, settings.L1_CACHE_TTL_SECONDS)
+
+# Short-lived cache of codes known not to exist, so repeated misses skip Redis and the DB
+negative_cache = LocalCache(settings.NEGATIVE_CACHE_MAX_SIZE, settings.NEGATIVE_CACHE_TTL_SECONDS)
+
+_listener_task: asyncio.Task | None = None
+
+async def publish_invalidation(redis_client: Redis, short_code: str):
+    """
+    Tells every worker (including this one) to drop its cached entries for a short code
+    and to add it to the short code Bloom filter.
+    Must be called whenever a short_code mapping is created or changed.
+    redis_client may be a pipeline, in which case the PUBLISH is only queued.
+    """
+    _handle_invalidation(short_code)
+    await redis_client.publish(settings.CACHE_INVALIDATION_CHANNEL, short_code)
+
+def _handle_invalidation(short_code: str):
+    """
+    Applies an invalidation message received from another worker.
+    """
+    url_cache.invalidate(short_code)
+    negative_cache.invalidate(short_code)
+    short_code_filter.add(short_code)
+
+def _reset_local_state():
+    """
+    Drops everything that may have missed invalidations while disconnected.
+    The Bloom filter stops rejecting lookups until it has been reloaded.
+    """
+    url_cache.clear()
+    negative_cache.clear()
+    short_code_filter.ready = False
+
+async def listen_for_invalidations(redis_client: Redis):
+    """
+    Subscribes to the invalidation channel and evicts local entries as messages arrive.
+    Reconnects on failure; local caches are cleared after every (re)subscribe and the
+    Bloom filter is reloaded after a reconnect, because messages may have been missed.
+    """
+    reconnecting = False
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+            url_cache.clear()
+            negative_cache.clear()
+            if reconnecting:
+                short_code_filter.start_loading()
+                reconnecting = False
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    _handle_invalidation(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Cache invalidation listener error: {e}")
+            _reset_local_state()
+            reconnecting = True
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.close()
+
+def start_invalidation_listener(redis_client: Redis):
+    """
+    Starts the background invalidation listener for this worker.
+    """
+    global _listener_task
+    if _listener_task is None or _listener_task.done():
+        _listener_task = asyncio.create_task(listen_for_invalidations(redis_client))
+
+async def stop_invalidation_listener():
+    """
+    Cancels the background invalidation listener.
+    """
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
@@ -1,12 +1,27 @@
 # app/main.py
-from fastapi import FastAPI, Depends, HTTPException, Request, status
-from fastapi.responses import RedirectResponse
+from fastapi import FastAPI, Depends, HTTPException, Request, Body, Query, status
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from redis.asyncio import Redis
-from database import init_db, get_db
+from database import init_db, get_db, get_session_factory
 from redis_client import get_redis_client, close_redis_connection
-from schemas import URLCreate, URLResponse, URLAnalytics
+from pydantic import ValidationError
+from schemas import URLCreate, URLResponse, URLAnalytics, URLAnalyticsBatchResponse, URLTimeseries, TrendingResponse, URLBatchResponse, URLBatchItemResult
+from typing import Any, List, Literal
+from datetime import date, datetime, timedelta, timezone
 from config import settings
+from local_cache import url_cache, negative_cache, start_invalidation_listener, stop_invalidation_listener
+from redis_client import redis_client as app_redis_client
+from click_ingest import click_ingestor
+from bloom import short_code_filter
+from fast_redirect import FastRedirectMiddleware
+from rehydrate import cache_rehydrator
+from code_pool import short_code_pool
+from partitions import click_partitions
+from click_counters import click_counter_write_back
+from click_export import export_clicks, EXPORT_FORMATS
+from rollups import GRANULARITY_STEPS
+from trending import top_trending
 import crud 
 from collections import defaultdict
 import time
@@ -17,6 +32,9 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Serve GET /{short_code} from a lean ASGI handler in front of FastAPI routing
+app.add_middleware(FastRedirectMiddleware, fastapi_app=app, enabled=settings.FAST_REDIRECT_ENABLED)
+
 # In-memory dictionary for basic rate limiting
 # Key: IP address, Value: List of timestamps for requests
 request_timestamps = defaultdict(list)
@@ -24,18 +42,37 @@ request_timestamps = defaultdict(list)
 @app.on_event("startup")
 async def startup_event():
     """
-    Handles startup events: initializes the database.
+    Handles startup events: initializes the database and starts background workers.
     """
     print("Starting up application...")
     await init_db()
     print("Database initialized.")
+    # Partitions for the current month must exist before clicks are written
+    await click_partitions.maintain_safely()
+    click_partitions.start()
+    start_invalidation_listener(app_redis_client)
+    print("L1 cache invalidation listener started.")
+    click_ingestor.start()
+    print("Click ingestor started.")
+    click_counter_write_back.start(app_redis_client)
+    short_code_filter.start_loading()
+    if settings.REHYDRATE_ON_STARTUP:
+        cache_rehydrator.start(app_redis_client)
+    if settings.SHORT_CODE_STRATEGY == "pool":
+        short_code_pool.start(app_redis_client)
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """
-    Handles shutdown events: closes Redis connection.
+    Handles shutdown events: flushes queued clicks, stops background listeners and closes Redis connection.
     """
     print("Shutting down application...")
+    await click_ingestor.stop()
+    print("Queued clicks flushed.")
+    await short_code_pool.stop()
+    await click_partitions.stop()
+    await click_counter_write_back.stop(app_redis_client)
+    await stop_invalidation_listener()
     await close_redis_connection()
     print("Redis connection closed.")
 
@@ -83,6 +120,89 @@ async def create_short_url_endpoint(
     db_url = await crud.create_short_url(db, url, redis_client)
     return db_url
 
+@app.post("/shorten/batch", response_model=URLBatchResponse)
+async def create_short_urls_batch_endpoint(
+    items: List[Any] = Body(...),
+    db: AsyncSession = Depends(get_db),
+    redis_client: Redis = Depends(get_redis_client),
+    # The whole batch counts as one request for rate limiting
+    rate_limit: None = Depends(rate_limit_dependency)
+):
+    """
+    Creates short URLs for an array of URLCreate items in one call.
+    Items are validated individually; invalid ones are reported with an error
+    while the rest are created. Results are returned in input order.
+    With DEDUP_LONG_URLS, items that resolve to an existing URL are counted in
+    `existing` rather than `created`.
+    """
+    if len(items) > settings.SHORTEN_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch may contain at most {settings.SHORTEN_BATCH_MAX_ITEMS} items."
+        )
+
+    results = [URLBatchItemResult(index=index) for index in range(len(items))]
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, URLCreate.model_validate(item)))
+        except ValidationError as e:
+            results[index].error = "; ".join(error["msg"] for error in e.errors())
+
+    created = 0
+    if valid:
+        shortened = await crud.create_short_urls(db, [url for _, url in valid], redis_client)
+        for (index, _), (short_code, record, is_new) in zip(valid, shortened):
+            results[index] = URLBatchItemResult(index=index, short_code=short_code, **record.model_dump())
+            created += is_new
+
+    return URLBatchResponse(created=created, existing=len(valid) - created, failed=len(items) - len(valid), results=results)
+
+@app.get("/metrics/cache")
+async def get_cache_metrics():
+    """
+    Returns counters for this worker's in-process URL cache, negative cache, short code Bloom filter
+    and coalesced DB fetches.
+    """
+    return {
+        "positive": url_cache.stats(),
+        "negative": negative_cache.stats(),
+        "bloom": short_code_filter.stats(),
+        "db_fetches": crud.url_fetches.stats(),
+    }
+
+@app.get("/metrics/clicks")
+async def get_click_metrics():
+    """
+    Returns queue depth and batch counters for this worker's click ingestion pipeline.
+    """
+    return click_ingestor.stats()
+
+@app.get("/metrics/click-counters")
+async def get_click_counter_metrics(redis_client: Redis = Depends(get_redis_client)):
+    """
+    Returns pending click deltas and write-back counters for urls.total_clicks.
+    """
+    return await click_counter_write_back.stats(redis_client)
+
+@app.get("/metrics/code-pool")
+async def get_code_pool_metrics(redis_client: Redis = Depends(get_redis_client)):
+    """
+    Returns the size of the pre-generated short code pool and its low-water-mark counters.
+    """
+    return await short_code_pool.stats(redis_client)
+
+@app.get("/health/ready")
+async def readiness_check(redis_client: Redis = Depends(get_redis_client)):
+    """
+    Readiness probe. Returns 503 until the hot set of links has been loaded into Redis.
+    """
+    ready = await cache_rehydrator.check_ready(redis_client)
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if ready else "rehydrating", "rehydration": cache_rehydrator.stats()},
+    )
+
 @app.get("/{short_code}", status_code=status.HTTP_307_TEMPORARY_REDIRECT)
 async def redirect_to_long_url(
     short_code: str,
@@ -93,31 +213,144 @@ async def redirect_to_long_url(
     """
     Redirects from the short URL to the original long URL.
     Records a click event for analytics.
+    Normally answered by FastRedirectMiddleware; this route serves redirects when
+    FAST_REDIRECT_ENABLED is off and documents the endpoint in the OpenAPI schema.
     """
-    long_url = await crud.get_long_url(db, short_code, redis_client)
-    if not long_url:
+    ip_address = get_client_ip(request)
+    # Resolve and count the click in one Redis call; fall back to the DB on a cache miss
+    record = await crud.resolve_and_record_click(short_code, ip_address, redis_client)
+    if record is crud.CACHE_MISS:
+        record = await crud.load_url_record(db, short_code, redis_client)
+        if record:
+            await crud.record_click(record.id, short_code, ip_address, redis_client)
+    if not record:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Short URL not found")
 
-    # Record the click event asynchronously
-    ip_address = get_client_ip(request)
-    await crud.record_click(db, short_code, ip_address, redis_client)
+    return RedirectResponse(url=record.long_url)
 
-    return RedirectResponse(url=long_url)
+@app.post("/analytics/batch", response_model=URLAnalyticsBatchResponse)
+async def get_url_analytics_batch_endpoint(
+    short_codes: List[str] = Body(...),
+    visitors_from: date | None = Query(None, alias="from"),
+    visitors_to: date | None = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_db),
+    redis_client: Redis = Depends(get_redis_client)
+):
+    """
+    Retrieves analytics for a list of short codes in one request, in the order given.
+    `from` and `to` select the days counted in unique_visitors, as for GET /analytics/{short_code}.
+    """
+    if len(short_codes) > settings.ANALYTICS_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many short codes; at most {settings.ANALYTICS_BATCH_MAX_ITEMS} per request",
+        )
+    if visitors_from and visitors_to and visitors_from > visitors_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'from' must not be after 'to'")
+    results = await crud.get_url_analytics_batch(db, short_codes, redis_client, visitors_from, visitors_to)
+    found = {result["short_code"] for result in results}
+    return URLAnalyticsBatchResponse(
+        results=[URLAnalytics(**result) for result in results],
+        not_found=[code for code in dict.fromkeys(short_codes) if code not in found],
+    )
+
+# Declared before /analytics/{short_code} so "trending" is not taken for a short code
+@app.get("/analytics/trending", response_model=TrendingResponse)
+async def get_trending_links(
+    window: str = "1h",
+    limit: int = Query(10, ge=1, le=settings.TRENDING_MAX_MEMBERS),
+    redis_client: Redis = Depends(get_redis_client)
+):
+    """
+    Returns the most clicked links of a window, ranked by exponentially decayed clicks.
+    """
+    if window not in settings.TRENDING_WINDOWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown window; expected one of {', '.join(settings.TRENDING_WINDOWS)}",
+        )
+    links = await top_trending(redis_client, window, limit)
+    return TrendingResponse(window=window, links=links)
 
 @app.get("/analytics/{short_code}", response_model=URLAnalytics)
 async def get_url_analytics_endpoint(
     short_code: str,
+    visitors_from: date | None = Query(None, alias="from"),
+    visitors_to: date | None = Query(None, alias="to"),
     db: AsyncSession = Depends(get_db),
     redis_client: Redis = Depends(get_redis_client)
 ):
     """
     Retrieves analytics for a specific short URL, including total clicks.
+    `from` and `to` (UTC dates, inclusive) select the days counted in unique_visitors.
     """
-    analytics_data = await crud.get_url_analytics(db, short_code, redis_client)
+    if visitors_from and visitors_to and visitors_from > visitors_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'from' must not be after 'to'")
+    analytics_data = await crud.get_url_analytics(db, short_code, redis_client, visitors_from, visitors_to)
     if not analytics_data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Short URL not found or no analytics available")
     return URLAnalytics(**analytics_data)
 
+def as_utc(value: datetime) -> datetime:
+    """
+    Converts a query timestamp to the naive UTC form stored in the database.
+    Timestamps without a timezone are taken to be UTC already.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+@app.get("/analytics/{short_code}/timeseries", response_model=URLTimeseries)
+async def get_url_timeseries_endpoint(
+    short_code: str,
+    start: datetime | None = Query(None, alias="from"),
+    end: datetime | None = Query(None, alias="to"),
+    granularity: Literal["minute", "hour", "day"] = "hour",
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Retrieves clicks over time for a specific short URL from the click rollups.
+    Defaults to the last 24 hours; `to` is exclusive. Empty buckets are returned as 0.
+    """
+    end = as_utc(end) if end else datetime.utcnow()
+    start = as_utc(start) if start else end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'from' must be before 'to'")
+    if (end - start) / GRANULARITY_STEPS[granularity] > settings.TIMESERIES_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many buckets; at most {settings.TIMESERIES_MAX_BUCKETS} per request",
+        )
+    timeseries = await crud.get_url_timeseries(db, short_code, start, end, granularity)
+    if not timeseries:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Short URL not found or no analytics available")
+    return URLTimeseries(**timeseries)
+
+@app.get("/analytics/{short_code}/clicks/export")
+async def export_url_clicks(
+    short_code: str,
+    request: Request,
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    db: AsyncSession = Depends(get_db),
+    session_factory=Depends(get_session_factory)
+):
+    """
+    Streams the raw click log of a specific short URL as NDJSON or CSV, oldest first.
+    The body is gzipped on the fly when the client accepts gzip.
+    """
+    url_id = await crud.get_url_id(db, short_code)
+    if url_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Short URL not found or no analytics available")
+    compress = "gzip" in request.headers.get("accept-encoding", "")
+    headers = {"Content-Disposition": f'attachment; filename="{short_code}-clicks.{export_format}"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export_clicks(url_id, export_format, compress, session_factory),
+        media_type=EXPORT_FORMATS[export_format],
+        headers=headers,
+    )
+
 @app.get("/")
 async def read_root():
     """
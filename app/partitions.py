@@ -0,0 +1,160 @@
+# app/partitions.py
+import asyncio
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from database import engine
+from config import settings
+
+DEFAULT_PARTITION = "click_events_default"
+# Serialises maintenance across workers (pg_advisory_xact_lock key)
+MAINTENANCE_LOCK_ID = 0x636C6B70
+_PARTITION_NAME = re.compile(r"^click_events_p(\d{4})(\d{2})$")
+
+def month_start(timestamp: datetime) -> datetime:
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def next_month(start: datetime) -> datetime:
+    return (start + timedelta(days=32)).replace(day=1)
+
+def partition_name(start: datetime) -> str:
+    return f"click_events_p{start:%Y%m}"
+
+class ClickPartitionManager:
+    """
+    Keeps click_events partitioned by month: creates the partitions for the current
+    and next `months_ahead` months, and enforces retention by dropping whole partitions
+    once every click in them is older than `retention_days` (0 keeps everything).
+    Dropping a partition is a metadata operation, unlike a DELETE followed by vacuum.
+    """
+
+    def __init__(self, months_ahead: int, retention_days: int, check_interval: float, db_engine: AsyncEngine | None = None):
+        self.engine = db_engine or engine
+        self.months_ahead = months_ahead
+        self.retention_days = retention_days
+        self.check_interval = check_interval
+        self.created = 0
+        self.dropped = 0
+        self.last_error: str | None = None
+        self._task: asyncio.Task | None = None
+
+    async def _is_partitioned(self, conn: AsyncConnection) -> bool:
+        # relkind is of type "char", which asyncpg returns as bytes; compare it as text
+        relkind = await conn.scalar(text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass('click_events')"))
+        return relkind == "p"
+
+    async def _partitions(self, conn: AsyncConnection) -> list[str]:
+        result = await conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'click_events'::regclass"
+        ))
+        return [name for name, in result]
+
+    async def _create_partition(self, conn: AsyncConnection, start: datetime):
+        """
+        Creates the partition for the month starting at `start`. If the default partition
+        already holds clicks for that month, they are moved into the new partition before
+        it is attached; Postgres refuses to attach a range the default partition overlaps.
+        """
+        name, end = partition_name(start), next_month(start)
+        bounds = {"start": start, "end": end}
+        overlapping = await conn.scalar(text(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+            "WHERE timestamp >= :start AND timestamp < :end)"
+        ), bounds)
+        if not overlapping:
+            await conn.execute(text(
+                f"CREATE TABLE {name} PARTITION OF click_events "
+                f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+            ))
+        else:
+            await conn.execute(text(f"CREATE TABLE {name} (LIKE click_events INCLUDING DEFAULTS)"))
+            await conn.execute(text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                "WHERE timestamp >= :start AND timestamp < :end RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            ), bounds)
+            await conn.execute(text(
+                f"ALTER TABLE click_events ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+            ))
+        self.created += 1
+        print(f"Created click_events partition {name}.")
+
+    async def maintain(self):
+        """
+        Creates missing partitions and drops expired ones in one transaction.
+        Does nothing, apart from a warning, if click_events is an unpartitioned table.
+        """
+        now = datetime.utcnow()
+        async with self.engine.begin() as conn:
+            if not await self._is_partitioned(conn):
+                print(
+                    "Warning: click_events is not partitioned; partition creation and retention are disabled. "
+                    "Recreate it as a partitioned table (e.g. rename it, start the app, then copy the rows over)."
+                )
+                return
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MAINTENANCE_LOCK_ID})
+            await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF click_events DEFAULT"))
+            existing = set(await self._partitions(conn))
+
+            start = month_start(now)
+            for _ in range(self.months_ahead + 1):
+                if partition_name(start) not in existing:
+                    await self._create_partition(conn, start)
+                start = next_month(start)
+
+            if self.retention_days > 0:
+                cutoff = now - timedelta(days=self.retention_days)
+                for name in sorted(existing):
+                    match = _PARTITION_NAME.match(name)
+                    if match and next_month(datetime(int(match[1]), int(match[2]), 1)) <= cutoff:
+                        await conn.execute(text(f"DROP TABLE {name}"))
+                        self.dropped += 1
+                        print(f"Dropped expired click_events partition {name}.")
+                await conn.execute(
+                    text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff"), {"cutoff": cutoff}
+                )
+
+    async def _run(self):
+        """
+        Maintenance loop; the first pass runs at startup (see main.startup_event).
+        """
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.maintain_safely()
+
+    async def maintain_safely(self):
+        try:
+            await self.maintain()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"click_events partition maintenance failed: {e}")
+
+    def start(self):
+        """
+        Starts periodic maintenance in the background.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Cancels periodic maintenance.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Process-wide partition manager
+click_partitions = ClickPartitionManager(
+    settings.CLICK_PARTITIONS_AHEAD_MONTHS,
+    settings.CLICK_RETENTION_DAYS,
+    settings.CLICK_PARTITION_CHECK_INTERVAL_SECONDS,
+)
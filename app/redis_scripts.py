@@ -0,0 +1,63 @@
+# app/redis_scripts.py
+from redis_client import redis_client
+
+# Resolves a short code and counts a click in one server-side call.
+# KEYS[1] = short:{code}, KEYS[2] = click stream, KEYS[3] = hits:{code}
+# KEYS[4] = hll:{code}:{yyyymmdd}, today's HyperLogLog of visitor IPs
+# KEYS[5] = hash of clicks per code not yet written back to urls.total_clicks (see click_counters.py)
+# KEYS[6..] = (current era, previous era) trending sorted set per window (see trending.py)
+# ARGV[1] = "1" to fetch and return the cached record first, "0" to only count
+# ARGV[2] = stream MAXLEN (0 disables the stream), ARGV[3] = short code, ARGV[4] = client IP
+# ARGV[5..8] = TTL min, TTL max, hits per doubling, hit window (see utils.cache_ttl)
+# ARGV[9] = lifetime of a daily HyperLogLog in seconds, ARGV[10] = trending set size limit
+# ARGV[11..] = (score increment, carry-over weight, key TTL) per trending window
+# hits:{code} counts hits in the current window. Once a code is hot (at least one TTL
+# doubling), its record's TTL is extended to the TTL its hits earn whenever less than
+# half of that remains (sliding renewal); cold codes keep their initial TTL.
+# Returns the record (or nil when ARGV[1] is "0"); returns nil and counts nothing
+# when the record is missing or not a JSON record, so the caller can fall back to the DB.
+RESOLVE_AND_COUNT_CLICK = """
+local record = nil
+if ARGV[1] == '1' then
+    record = redis.call('GET', KEYS[1])
+    if not record or string.sub(record, 1, 1) ~= '{' then
+        return nil
+    end
+end
+redis.call('HINCRBY', KEYS[5], ARGV[3], 1)
+local maxlen = tonumber(ARGV[2])
+if maxlen > 0 then
+    redis.call('XADD', KEYS[2], 'MAXLEN', '~', maxlen, '*', 'code', ARGV[3], 'ip', ARGV[4])
+end
+if ARGV[4] ~= '' and redis.call('PFADD', KEYS[4], ARGV[4]) == 1 and redis.call('TTL', KEYS[4]) < 0 then
+    redis.call('EXPIRE', KEYS[4], ARGV[9])
+end
+local max_members = tonumber(ARGV[10])
+for i = 6, #KEYS, 2 do
+    local arg = 11 + (i - 6) / 2 * 3
+    local created = redis.call('EXISTS', KEYS[i]) == 0
+    if created and redis.call('EXISTS', KEYS[i + 1]) == 1 then
+        redis.call('ZUNIONSTORE', KEYS[i], 1, KEYS[i + 1], 'WEIGHTS', ARGV[arg + 1])
+    end
+    redis.call('ZINCRBY', KEYS[i], ARGV[arg], ARGV[3])
+    if created then
+        redis.call('EXPIRE', KEYS[i], ARGV[arg + 2])
+    end
+    if redis.call('ZCARD', KEYS[i]) > max_members then
+        redis.call('ZREMRANGEBYRANK', KEYS[i], 0, -max_members - 1)
+    end
+end
+local hits = redis.call('INCR', KEYS[3])
+if hits == 1 then
+    redis.call('EXPIRE', KEYS[3], ARGV[8])
+end
+local doublings = math.min(math.floor(math.log(1 + hits / tonumber(ARGV[7])) / math.log(2)), 32)
+local ttl = math.min(tonumber(ARGV[6]), tonumber(ARGV[5]) * 2 ^ doublings)
+local remaining = redis.call('TTL', KEYS[1])
+if doublings >= 1 and remaining >= 0 and remaining < ttl / 2 then
+    redis.call('EXPIRE', KEYS[1], math.floor(ttl))
+end
+return record
+"""
+
+resolve_and_count_click = redis_client.register_script(RESOLVE_AND_COUNT_CLICK)
@@ -0,0 +1,186 @@
+# app/rehydrate.py
+import asyncio
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, cast, BigInteger
+from redis.asyncio import Redis
+from redis.exceptions import LockError
+from database import AsyncSessionLocal, URL, ClickRollupHour
+from schemas import CachedURL
+from utils import cache_ttl
+from config import settings
+
+# Set once the hot set is back in Redis; a Redis restart or flush removes it
+HYDRATED_KEY = "cache:hydrated"
+LOCK_KEY = "cache:rehydrate:lock"
+
+class CacheRehydrator:
+    """
+    Reloads short:{code} records into Redis after a restart or flush, most recently
+    clicked links first, in pipelined batches. Click totals are not seeded: analytics
+    reads them from urls.total_clicks (see click_counters.py).
+    Only one worker runs the job at a time (guarded by a Redis lock); every worker
+    reports ready once the hot set has been loaded by any of them.
+    """
+
+    def __init__(self, hot_set_size: int, max_keys: int, batch_size: int, window_days: int, session_factory=None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.hot_set_size = hot_set_size
+        self.max_keys = max_keys
+        self.batch_size = batch_size
+        self.window_days = window_days
+        self.ready = False
+        self.running = False
+        self.loaded = 0
+        self.runs = 0
+        self.last_duration_seconds: float | None = None
+        self.last_error: str | None = None
+        self._task: asyncio.Task | None = None
+
+    def _query(self, limit: int):
+        """
+        URLs ordered by clicks within the recent window.
+        """
+        since = datetime.utcnow() - timedelta(days=self.window_days)
+        recent = (
+            # SUM(bigint) is numeric in Postgres; cast it back so Python gets an int, not a Decimal
+            select(ClickRollupHour.short_code_id, cast(func.sum(ClickRollupHour.clicks), BigInteger).label("clicks"))
+            .filter(ClickRollupHour.bucket_start >= since)
+            .group_by(ClickRollupHour.short_code_id)
+            .subquery()
+        )
+        return (
+            select(
+                URL.id, URL.short_code, URL.long_url, URL.created_at,
+                func.coalesce(recent.c.clicks, 0).label("recent_clicks"),
+            )
+            .outerjoin(recent, recent.c.short_code_id == URL.id)
+            .order_by(func.coalesce(recent.c.clicks, 0).desc(), URL.id.desc())
+            .limit(limit)
+        )
+
+    async def rehydrate(self, redis_client: Redis, limit: int | None = None, lock=None) -> int:
+        """
+        Streams up to `limit` mappings from the DB into Redis and returns how many were loaded.
+        """
+        limit = limit or self.max_keys
+        # Scales clicks over the rehydration window to hits per TTL window
+        hits_per_click = settings.CACHE_TTL_WINDOW_SECONDS / (self.window_days * 86400)
+        self.running = True
+        self.loaded = 0
+        started = time.monotonic()
+        print(f"Rehydrating Redis cache (up to {limit} links)...")
+        try:
+            async with self.session_factory() as session:
+                result = await session.stream(self._query(limit).execution_options(yield_per=self.batch_size))
+                async for rows in result.partitions():
+                    async with redis_client.pipeline(transaction=False) as pipe:
+                        for row in rows:
+                            record = CachedURL(id=row.id, long_url=row.long_url, created_at=row.created_at)
+                            pipe.setex(
+                                f"short:{row.short_code}",
+                                cache_ttl(row.recent_clicks * hits_per_click),
+                                record.model_dump_json(),
+                            )
+                        await pipe.execute()
+                    self.loaded += len(rows)
+                    if lock is not None:
+                        await lock.reacquire()
+                    if not self.ready and self.loaded >= min(self.hot_set_size, limit):
+                        await redis_client.set(HYDRATED_KEY, int(time.time()))
+                        self.ready = True
+                        print(f"Hot set loaded ({self.loaded} links); reporting ready.")
+                    print(f"Rehydrated {self.loaded} links ({time.monotonic() - started:.1f}s)")
+            # Fewer links than the hot set exist: everything is loaded
+            await redis_client.set(HYDRATED_KEY, int(time.time()))
+            self.ready = True
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            raise
+        finally:
+            self.running = False
+            self.runs += 1
+            self.last_duration_seconds = time.monotonic() - started
+        print(f"Cache rehydration finished: {self.loaded} links in {self.last_duration_seconds:.1f}s.")
+        return self.loaded
+
+    async def _run_if_needed(self, redis_client: Redis):
+        """
+        Rehydrates unless Redis still holds the hot set or another worker is already on it.
+        """
+        try:
+            if await redis_client.exists(HYDRATED_KEY):
+                self.ready = True
+                return
+            lock = redis_client.lock(LOCK_KEY, timeout=settings.REHYDRATE_LOCK_TIMEOUT_SECONDS)
+            if not await lock.acquire(blocking=False):
+                return
+            try:
+                await self.rehydrate(redis_client, lock=lock)
+            finally:
+                try:
+                    await lock.release()
+                except LockError:
+                    pass
+        except Exception as e:
+            print(f"Cache rehydration failed: {e}")
+
+    def start(self, redis_client: Redis):
+        """
+        Runs the job in the background if it is needed and not already running here.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_if_needed(redis_client))
+
+    async def check_ready(self, redis_client: Redis) -> bool:
+        """
+        Readiness check. Once ready, a worker stays ready; if Redis has lost the hot set
+        since (restart or flush), a background rehydration is started instead.
+        """
+        hydrated = await redis_client.exists(HYDRATED_KEY)
+        if hydrated:
+            self.ready = True
+        elif not self.running:
+            self.start(redis_client)
+        return self.ready
+
+    def stats(self) -> dict:
+        """
+        Returns progress of the current or last rehydration run.
+        """
+        return {
+            "ready": self.ready,
+            "running": self.running,
+            "loaded": self.loaded,
+            "hot_set_size": self.hot_set_size,
+            "runs": self.runs,
+            "last_duration_seconds": self.last_duration_seconds,
+            "last_error": self.last_error,
+        }
+
+# Process-wide rehydrator
+cache_rehydrator = CacheRehydrator(
+    settings.REHYDRATE_HOT_SET_SIZE,
+    settings.REHYDRATE_MAX_KEYS,
+    settings.REHYDRATE_BATCH_SIZE,
+    settings.REHYDRATE_WINDOW_DAYS,
+)
+
+async def _main():
+    """
+    On-demand entry point: python rehydrate.py [--limit N]
+    """
+    import argparse
+    from redis_client import redis_client, close_redis_connection
+
+    parser = argparse.ArgumentParser(description="Reload hot short URL mappings into Redis.")
+    parser.add_argument("--limit", type=int, default=None, help="maximum number of links to load")
+    args = parser.parse_args()
+    try:
+        await cache_rehydrator.rehydrate(redis_client, limit=args.limit)
+    finally:
+        await close_redis_connection()
+
+if __name__ == "__main__":
+    asyncio.run(_main())
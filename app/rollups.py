@@ -0,0 +1,110 @@
+# app/rollups.py
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import ClickEvent, ClickRollupMinute, ClickRollupHour, ClickRollupDay
+
+# Rollup table for each supported bucket size
+ROLLUP_TABLES = {
+    "minute": ClickRollupMinute,
+    "hour": ClickRollupHour,
+    "day": ClickRollupDay,
+}
+
+# Bucket width of each granularity
+GRANULARITY_STEPS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """
+    Truncates a timestamp to the start of its minute, hour or day bucket.
+    """
+    if granularity == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+async def apply_click_rollups(session: AsyncSession, clicks: list[tuple[int, datetime]]):
+    """
+    Adds a batch of (short_code_id, timestamp) clicks to every rollup table.
+    The batch is pre-aggregated per bucket, then upserted with one
+    INSERT ... ON CONFLICT DO UPDATE SET clicks = clicks + excluded.clicks per table.
+    Runs in the caller's transaction, so rollups commit together with the raw events.
+    """
+    for granularity, table in ROLLUP_TABLES.items():
+        counts = Counter((url_id, bucket_start(timestamp, granularity)) for url_id, timestamp in clicks)
+        statement = pg_insert(table).values([
+            {"short_code_id": url_id, "bucket_start": start, "clicks": count}
+            # Sorted so concurrent flushes lock shared rows in the same order and cannot deadlock
+            for (url_id, start), count in sorted(counts.items())
+        ])
+        await session.execute(statement.on_conflict_do_update(
+            index_elements=[table.short_code_id, table.bucket_start],
+            set_={"clicks": table.clicks + statement.excluded.clicks},
+        ))
+
+async def click_timeseries(session: AsyncSession, url_id: int, start: datetime, end: datetime, granularity: str) -> list[int]:
+    """
+    Click counts for one URL per bucket in [start, end), with empty buckets filled with 0.
+    `start` must already be aligned to a bucket boundary (see bucket_start).
+    Reads one rollup row per non-empty bucket through the table's primary key.
+    """
+    table = ROLLUP_TABLES[granularity]
+    step = GRANULARITY_STEPS[granularity]
+    result = await session.execute(
+        select(table.bucket_start, table.clicks)
+        .filter(table.short_code_id == url_id, table.bucket_start >= start, table.bucket_start < end)
+    )
+    counts = [0] * -(-(end - start) // step)
+    for bucket, clicks in result:
+        counts[(bucket - start) // step] = clicks
+    return counts
+
+async def backfill_rollups(session: AsyncSession):
+    """
+    Rebuilds every rollup table from click_events with one grouped statement per table.
+    Meant to be run once, when rollups are introduced on a database that already has clicks;
+    clicks ingested while it runs may be counted against the snapshot it reads.
+    """
+    for granularity, table in ROLLUP_TABLES.items():
+        print(f"Backfilling {table.__tablename__}...")
+        bucket = func.date_trunc(granularity, ClickEvent.timestamp)
+        rows = (
+            select(ClickEvent.short_code_id, bucket, func.count(ClickEvent.id))
+            .filter(ClickEvent.timestamp.is_not(None))
+            .group_by(ClickEvent.short_code_id, bucket)
+        )
+        statement = pg_insert(table).from_select(["short_code_id", "bucket_start", "clicks"], rows)
+        await session.execute(statement.on_conflict_do_update(
+            index_elements=[table.short_code_id, table.bucket_start],
+            set_={"clicks": statement.excluded.clicks},
+        ))
+    await session.commit()
+    print("Rollup backfill finished.")
+
+async def _main():
+    """
+    One-off entry point: python rollups.py --backfill
+    """
+    import argparse
+    from database import AsyncSessionLocal, init_db
+
+    parser = argparse.ArgumentParser(description="Maintain click rollup tables.")
+    parser.add_argument("--backfill", action="store_true", help="rebuild rollups from click_events")
+    args = parser.parse_args()
+    if args.backfill:
+        await init_db()
+        async with AsyncSessionLocal() as session:
+            await backfill_rollups(session)
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -1,7 +1,7 @@
 # app/schemas.py
 from pydantic import BaseModel, HttpUrl
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List
 
 class URLCreate(BaseModel):
     """
@@ -22,6 +22,66 @@ class URLResponse(BaseModel):
     class Config:
         from_attributes = True # Allows mapping from SQLAlchemy models
 
+class TrendingLink(BaseModel):
+    """
+    Pydantic model for one trending link; score is its exponentially decayed click count.
+    """
+    short_code: str
+    score: float
+
+class TrendingResponse(BaseModel):
+    """
+    Pydantic model for the top trending links of a window, highest score first.
+    """
+    window: str
+    links: List[TrendingLink]
+
+class URLTimeseries(BaseModel):
+    """
+    Pydantic model for clicks over time in columnar form.
+    counts[i] is the number of clicks in the bucket starting at start + i * step_seconds;
+    buckets without clicks are included as 0.
+    """
+    short_code: str
+    granularity: str
+    start: datetime
+    step_seconds: int
+    counts: List[int]
+
+class URLBatchItemResult(BaseModel):
+    """
+    Pydantic model for one item of a batch shorten response.
+    Either the created URL fields or an error message is set.
+    """
+    index: int
+    short_code: Optional[str] = None
+    long_url: Optional[str] = None
+    created_at: Optional[datetime] = None
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class URLBatchResponse(BaseModel):
+    """
+    Pydantic model for the batch shorten response; results are in input order.
+    `existing` counts valid items that resolved to an already stored URL (DEDUP_LONG_URLS).
+    """
+    created: int
+    existing: int = 0
+    failed: int
+    results: List[URLBatchItemResult]
+
+class CachedURL(BaseModel):
+    """
+    Pydantic model for the short_code record kept in Redis (short:{code}) and the L1 cache.
+    Holds the URL primary key so a redirect can attribute its click without a DB lookup.
+    """
+    id: int
+    long_url: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
 class ClickEventResponse(BaseModel):
     """
     Pydantic model for a single click event.
@@ -35,12 +95,21 @@ class ClickEventResponse(BaseModel):
 class URLAnalytics(BaseModel):
     """
     Pydantic model for URL analytics, including total clicks.
+    unique_visitors is a HyperLogLog estimate of distinct client IPs over the requested days.
     """
     short_code: str
     long_url: str
     created_at: datetime
     total_clicks: int
+    unique_visitors: int
 
     class Config:
         from_attributes = True
 
+class URLAnalyticsBatchResponse(BaseModel):
+    """
+    Pydantic model for analytics of many short URLs, in request order.
+    Codes that do not exist are listed in not_found.
+    """
+    results: List[URLAnalytics]
+    not_found: List[str]
@@ -0,0 +1,59 @@
+# app/singleflight.py
+import asyncio
+from typing import Any, Awaitable, Callable
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key within this worker.
+    The first caller (the leader) runs the function; everyone who arrives while it
+    is in flight awaits the same result or exception instead of running it again.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs fn() unless a call for key is already in flight, in which case its result is shared.
+        """
+        while key in self._calls:
+            future = self._calls[key]
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # If the leader was cancelled (e.g. its client disconnected), try again;
+                # otherwise this caller itself was cancelled.
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.leaders += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved so a leader without waiters doesn't log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        """
+        Returns how many calls ran and how many were served by an in-flight call.
+        """
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,55 @@
+# app/trending.py
+import math
+import time
+from redis.asyncio import Redis
+from config import settings
+
+# Forward-decayed popularity of each short code, one sorted set per configured window.
+# A click at time t adds exp((t - era_start) / window) to the code's score, so scores
+# never have to be rewritten as time passes: dividing by exp((now - era_start) / window)
+# gives sum(exp(-(now - t) / window)) over all clicks, i.e. exponentially decayed clicks.
+# To keep the weights finite, time is split into eras of TRENDING_ERA_WINDOWS windows;
+# the first click of a new era carries the previous era's set over, rescaled, with ZUNIONSTORE.
+
+def _era(window_seconds: int, now: float) -> tuple[int, int]:
+    """
+    Returns the era index containing `now` and the era length in seconds.
+    """
+    era_seconds = window_seconds * settings.TRENDING_ERA_WINDOWS
+    return int(now // era_seconds), era_seconds
+
+def trending_key(window: str, era: int) -> str:
+    return f"trending:{window}:{era}"
+
+def trending_script_args(now: float | None = None) -> tuple[list[str], list]:
+    """
+    Keys and per-window args for the trending part of the resolve_and_count_click script:
+    (current era key, previous era key) and (increment, carry-over weight, key TTL) per window.
+    """
+    now = time.time() if now is None else now
+    keys, args = [], []
+    for window, window_seconds in settings.TRENDING_WINDOWS.items():
+        era, era_seconds = _era(window_seconds, now)
+        keys += [trending_key(window, era), trending_key(window, era - 1)]
+        args += [
+            repr(math.exp((now - era * era_seconds) / window_seconds)),
+            repr(math.exp(-settings.TRENDING_ERA_WINDOWS)),
+            2 * era_seconds,
+        ]
+    return keys, args
+
+async def top_trending(redis_client: Redis, window: str, limit: int, now: float | None = None) -> list[dict]:
+    """
+    Returns the `limit` highest-scoring codes for a window with their decayed click counts.
+    One ZREVRANGE, O(log N + limit); falls back to the previous era before its first click is carried over.
+    """
+    now = time.time() if now is None else now
+    window_seconds = settings.TRENDING_WINDOWS[window]
+    era, era_seconds = _era(window_seconds, now)
+    members = []
+    for candidate in (era, era - 1):
+        members = await redis_client.zrevrange(trending_key(window, candidate), 0, limit - 1, withscores=True)
+        if members:
+            scale = math.exp(-(now - candidate * era_seconds) / window_seconds)
+            break
+    return [{"short_code": code, "score": score * scale} for code, score in members]
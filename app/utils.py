@@ -1,5 +1,8 @@
 # app/utils.py
+import hashlib
+import math
 import shortuuid
+from urllib.parse import urlsplit, urlunsplit
 from config import settings
 
 def generate_short_code() -> str:
@@ -9,3 +12,90 @@ def generate_short_code() -> str:
     """
     return shortuuid.uuid()[:settings.SHORT_CODE_LENGTH]
 
+# Digits first, then upper and lower case, so codes sort in the same order as their integers
+BASE62_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+def encode_base62(number: int, length: int) -> str:
+    """
+    Encodes a non-negative integer as a fixed-length base62 string (left-padded with "0").
+    Raises ValueError if the number does not fit in `length` characters.
+    """
+    if number < 0 or number >= 62 ** length:
+        raise ValueError(f"{number} does not fit in {length} base62 characters")
+    chars = []
+    for _ in range(length):
+        number, remainder = divmod(number, 62)
+        chars.append(BASE62_ALPHABET[remainder])
+    return "".join(reversed(chars))
+
+def decode_base62(code: str) -> int:
+    """
+    Inverse of encode_base62.
+    """
+    number = 0
+    for char in code:
+        number = number * 62 + BASE62_ALPHABET.index(char)
+    return number
+
+def scramble_id(number: int, length: int, key: str, rounds: int = 4) -> int:
+    """
+    Keyed bijection on [0, 62**length), so sequential IDs do not produce guessable codes.
+    Uses a balanced Feistel network over the smallest even number of bits that covers
+    the range, and cycle-walks until the result falls inside it.
+    """
+    domain = 62 ** length
+    half_bits = (max(domain - 1, 1).bit_length() + 1) // 2
+    mask = (1 << half_bits) - 1
+    key_bytes = key.encode()[:64]
+
+    def round_function(round_index: int, value: int) -> int:
+        digest = hashlib.blake2b(
+            value.to_bytes(8, "big") + bytes([round_index]), key=key_bytes, digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "big") & mask
+
+    while True:
+        left, right = number >> half_bits, number & mask
+        for round_index in range(rounds):
+            left, right = right, left ^ round_function(round_index, right)
+        number = (left << half_bits) | right
+        if number < domain:
+            return number
+
+
+def cache_ttl(hits: float) -> int:
+    """
+    Returns the Redis TTL (seconds) for a short:{code} record given how often the
+    code was hit during the last CACHE_TTL_WINDOW_SECONDS.
+    Starts at CACHE_TTL_MIN_SECONDS for cold codes and doubles every time the hit
+    count passes another multiple of CACHE_TTL_HITS_PER_DOUBLING, up to CACHE_TTL_MAX_SECONDS.
+    Must stay in sync with the TTL computation in redis_scripts.RESOLVE_AND_COUNT_CLICK.
+    """
+    doublings = math.floor(math.log2(1 + hits / settings.CACHE_TTL_HITS_PER_DOUBLING))
+    return int(min(settings.CACHE_TTL_MAX_SECONDS, settings.CACHE_TTL_MIN_SECONDS * 2 ** min(doublings, 32)))
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalizes a URL so trivially different spellings of the same destination compare equal:
+    lower-case scheme and host, no default port, and "/" for an empty path.
+    Query string and fragment are kept as-is, since they can change the destination.
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]" # IPv6 literal
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if parts.username is not None:
+        userinfo = parts.username if parts.password is None else f"{parts.username}:{parts.password}"
+        host = f"{userinfo}@{host}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, parts.fragment))
+
+def long_url_digest(url: str) -> bytes:
+    """
+    Fixed-size (32 byte) digest of the canonical form of a URL, used for deduplication.
+    """
+    return hashlib.sha256(canonicalize_url(url).encode()).digest()
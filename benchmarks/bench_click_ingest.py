@@ -0,0 +1,125 @@
+# benchmarks/bench_click_ingest.py
+"""
+Compares click write throughput at a fixed offered load for three paths:
+
+  add-commit  the original record_click path: one ClickEvent db.add() + commit() per click
+  insert      ClickIngestor with multi-row INSERT batches
+  copy        ClickIngestor with binary COPY batches (copy_records_to_table)
+
+For each offered rate, clicks are submitted in 10 ms ticks for --seconds seconds.
+The benchmark then reports how long it took until every click was written.
+A path keeps up when its achieved rate is close to the offered rate.
+The batched paths also maintain the click rollups; add-commit does not.
+Requires the Postgres configured in .env. Benchmark rows are deleted afterwards.
+
+    python benchmarks/bench_click_ingest.py --rates 10000 50000 100000 --seconds 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+from sqlalchemy import delete, insert
+from database import engine, init_db, AsyncSessionLocal, URL, ClickEvent, ClickRollupMinute, ClickRollupHour, ClickRollupDay
+from partitions import click_partitions
+from click_ingest import ClickIngestor
+from config import settings
+
+TICK_SECONDS = 0.01
+
+async def offer(rate: int, seconds: float, url_ids: list[int], submit):
+    """
+    Calls submit(url_id, ip) rate times per second, paced in ticks, for `seconds`.
+    """
+    per_tick = max(1, round(rate * TICK_SECONDS))
+    start = time.perf_counter()
+    for tick in range(round(seconds / TICK_SECONDS)):
+        for _ in range(per_tick):
+            submit(random.choice(url_ids), f"10.0.{random.randint(0, 255)}.{random.randint(0, 255)}")
+        delay = start + (tick + 1) * TICK_SECONDS - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    return per_tick * round(seconds / TICK_SECONDS)
+
+async def run_add_commit(rate: int, seconds: float, url_ids: list[int], concurrency: int) -> tuple[int, int]:
+    """
+    One session.add() + commit() per click, from `concurrency` workers (one pooled connection each).
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    written = 0
+
+    async def worker():
+        nonlocal written
+        while True:
+            url_id, ip_address = await queue.get()
+            async with AsyncSessionLocal() as session:
+                session.add(ClickEvent(short_code_id=url_id, ip_address=ip_address))
+                await session.commit()
+            written += 1
+            queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    offered = await offer(rate, seconds, url_ids, lambda url_id, ip: queue.put_nowait((url_id, ip)))
+    await queue.join()
+    for task in workers:
+        task.cancel()
+    return offered, written
+
+async def run_ingestor(writer: str, rate: int, seconds: float, url_ids: list[int]) -> tuple[int, int]:
+    """
+    ClickIngestor with the configured batch size and flush interval; stop() drains the queue.
+    """
+    ingestor = ClickIngestor(10_000_000, settings.CLICK_BATCH_SIZE, settings.CLICK_FLUSH_INTERVAL_SECONDS, writer)
+    ingestor.start()
+    offered = await offer(rate, seconds, url_ids, ingestor.submit)
+    await ingestor.stop()
+    if ingestor.failed:
+        print(f"  {writer}: {ingestor.failed} clicks failed to write")
+    return offered, ingestor.written
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rates", type=int, nargs="+", default=[10000, 50000, 100000])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--urls", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10, help="sessions used by add-commit")
+    parser.add_argument("--paths", nargs="+", default=["add-commit", "insert", "copy"])
+    args = parser.parse_args()
+
+    engine.echo = False
+    await init_db()
+    await click_partitions.maintain()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            insert(URL).returning(URL.id),
+            [{"short_code": f"bench-ingest-{i}-{time.time_ns()}", "long_url": "https://bench.example.com"} for i in range(args.urls)],
+        )
+        url_ids = list(result.scalars())
+        await db.commit()
+
+    print(f"{'path':<12}{'offered/s':>11}{'clicks':>10}{'written':>10}{'seconds':>9}{'achieved/s':>12}  keeps up")
+    try:
+        for rate in args.rates:
+            for path in args.paths:
+                start = time.perf_counter()
+                if path == "add-commit":
+                    offered, written = await run_add_commit(rate, args.seconds, url_ids, args.concurrency)
+                else:
+                    offered, written = await run_ingestor(path, rate, args.seconds, url_ids)
+                elapsed = time.perf_counter() - start
+                achieved = written / elapsed
+                keeps_up = "yes" if written == offered and elapsed <= args.seconds * 1.1 + settings.CLICK_FLUSH_INTERVAL_SECONDS else "no"
+                print(f"{path:<12}{rate:>11}{offered:>10}{written:>10}{elapsed:>9.2f}{achieved:>12.0f}  {keeps_up}")
+    finally:
+        async with AsyncSessionLocal() as db:
+            for table in (ClickEvent, ClickRollupMinute, ClickRollupHour, ClickRollupDay):
+                await db.execute(delete(table).where(table.short_code_id.in_(url_ids)))
+            await db.execute(delete(URL).where(URL.id.in_(url_ids)))
+            await db.commit()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+# benchmarks/bench_create_roundtrips.py
+"""
+Counts database round trips made by one POST /shorten create, comparing the
+original SELECT + INSERT + commit + refresh path with the current
+INSERT ... ON CONFLICT DO NOTHING RETURNING path (crud.create_short_url).
+
+Statements, BEGINs and COMMITs are counted with SQLAlchemy engine events.
+Requires the Postgres and Redis configured in .env.
+
+    python benchmarks/bench_create_roundtrips.py --creates 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+from sqlalchemy import event, select
+from database import engine, init_db, AsyncSessionLocal, URL
+from redis_client import redis_client, close_redis_connection
+from schemas import URLCreate, CachedURL
+from utils import generate_short_code
+import crud
+
+counts = Counter()
+
+@event.listens_for(engine.sync_engine, "begin")
+def _on_begin(conn):
+    counts["begin"] += 1
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _on_execute(conn, cursor, statement, parameters, context, executemany):
+    counts["statements"] += 1
+
+@event.listens_for(engine.sync_engine, "commit")
+def _on_commit(conn):
+    counts["commit"] += 1
+
+async def legacy_create(db, url: URLCreate):
+    """
+    The create path as it was before the single-statement insert.
+    """
+    while True:
+        short_code = generate_short_code()
+        existing_url = await db.scalar(select(URL).filter(URL.short_code == short_code))
+        if not existing_url:
+            break
+    db_url = URL(long_url=str(url.long_url), short_code=short_code)
+    db.add(db_url)
+    await db.commit()
+    await db.refresh(db_url)
+    await redis_client.setex(f"short:{short_code}", 86400, CachedURL.model_validate(db_url).model_dump_json())
+    return db_url
+
+async def measure(name: str, create, creates: int):
+    counts.clear()
+    start = time.perf_counter()
+    for i in range(creates):
+        async with AsyncSessionLocal() as db:
+            await create(db, URLCreate(long_url=f"https://bench.example.com/{name}/{i}"))
+    elapsed = time.perf_counter() - start
+    round_trips = counts["begin"] + counts["statements"] + counts["commit"]
+    print(
+        f"{name:<8}{counts['begin'] / creates:>8.2f}{counts['statements'] / creates:>12.2f}"
+        f"{counts['commit'] / creates:>9.2f}{round_trips / creates:>14.2f}{elapsed / creates * 1000:>12.2f}"
+    )
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--creates", type=int, default=200)
+    args = parser.parse_args()
+
+    engine.echo = False
+    await init_db()
+    print(f"{'path':<8}{'BEGIN':>8}{'statements':>12}{'COMMIT':>9}{'round trips':>14}{'ms/create':>12}")
+    await measure("legacy", legacy_create, args.creates)
+    await measure("current", lambda db, url: crud.create_short_url(db, url, redis_client), args.creates)
+    await close_redis_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+# benchmarks/bench_redirect.py
+"""
+Compares GET /{short_code} throughput of the FastAPI route with the
+FastRedirectMiddleware fast path, in requests per second per core.
+
+Requests are driven straight through the ASGI app (no HTTP server or client),
+so the numbers isolate application overhead. Throughput is computed from CPU
+time, which makes it a per-core figure. Each mode runs in its own process.
+Requires the Postgres and Redis configured in .env.
+
+    python benchmarks/bench_redirect.py --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+async def run_mode(mode: str, requests: int):
+    """
+    Creates one short URL, warms the caches, then issues `requests` redirects.
+    """
+    os.environ["FAST_REDIRECT_ENABLED"] = "true" if mode == "fast" else "false"
+    sys.path.insert(0, APP_DIR)
+    from main import app
+    from database import init_db, AsyncSessionLocal
+    from redis_client import redis_client, close_redis_connection
+    from schemas import URLCreate
+    import crud
+
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        db_url = await crud.create_short_url(db, URLCreate(long_url="https://bench.example.com/landing"), redis_client)
+
+    path = f"/{db_url.short_code}"
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    statuses = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    for _ in range(500):
+        await app(dict(scope), receive, send)
+    statuses.clear()
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+    assert statuses == [307] * requests, "unexpected response status"
+    await close_redis_connection()
+    print(f"{mode}\t{requests / cpu:.0f}\t{requests / wall:.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--mode", choices=["route", "fast"], help="run a single mode (used internally)")
+    args = parser.parse_args()
+
+    if args.mode:
+        asyncio.run(run_mode(args.mode, args.requests))
+        return
+
+    results = {}
+    for mode in ("route", "fast"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--requests", str(args.requests)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        _, per_core, wall = output.strip().splitlines()[-1].split("\t")
+        results[mode] = (float(per_core), float(wall))
+
+    print(f"{'mode':<8}{'req/s/core':>14}{'req/s (wall)':>16}")
+    for mode, (per_core, wall) in results.items():
+        print(f"{mode:<8}{per_core:>14.0f}{wall:>16.0f}")
+    print(f"speedup: {results['fast'][0] / results['route'][0]:.2f}x per core")
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,9 @@ from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from app.main import app
-from app.database import Base, get_db, engine as app_engine
+from sqlalchemy import insert, delete
+from app.database import Base, get_db, get_session_factory, engine as app_engine
+from app.database import URL, ClickEvent, ClickRollupMinute, ClickRollupHour, ClickRollupDay
 from app.redis_client import get_redis_client, redis_client as app_redis_client
 from app.config import settings
 from app.main import request_timestamps # Import the rate limiting dictionary
@@ -52,6 +54,48 @@ async def db_session():
             await session.rollback()
             await session.close()
 
+@pytest_asyncio.fixture
+async def test_db_engine():
+    """
+    Provides the test database engine, for components that take an engine.
+    """
+    return test_engine
+
+@pytest_asyncio.fixture
+async def committed_urls():
+    """
+    Provides a factory for URLs created in committed transactions, so that code which
+    opens its own sessions (background workers) can see them.
+    The URLs, their clicks and rollups are deleted after the test.
+    """
+    created_ids = []
+
+    async def create(count: int = 1, prefix: str = "committed"):
+        async with TestAsyncSessionLocal() as session:
+            result = await session.execute(
+                insert(URL).returning(URL.id, URL.short_code),
+                [{"short_code": f"{prefix}{len(created_ids) + i}", "long_url": f"https://{prefix}.test.com/{i}"} for i in range(count)],
+            )
+            rows = result.all()
+            await session.commit()
+        created_ids.extend(row.id for row in rows)
+        return rows
+
+    yield create
+
+    async with TestAsyncSessionLocal() as session:
+        for table in (ClickEvent, ClickRollupMinute, ClickRollupHour, ClickRollupDay):
+            await session.execute(delete(table).where(table.short_code_id.in_(created_ids)))
+        await session.execute(delete(URL).where(URL.id.in_(created_ids)))
+        await session.commit()
+
+@pytest_asyncio.fixture
+async def test_session_factory():
+    """
+    Provides the test database session factory, for components that open their own sessions.
+    """
+    return TestAsyncSessionLocal
+
 @pytest_asyncio.fixture
 async def test_redis_client():
     """
@@ -80,6 +124,7 @@ async def client(db_session: AsyncSession, test_redis_client):
     # Override the dependencies in the FastAPI app
     app.dependency_overrides[get_db] = override_get_db
     app.dependency_overrides[get_redis_client] = override_get_redis_client
+    app.dependency_overrides[get_session_factory] = lambda: TestAsyncSessionLocal
 
     # Clear the rate limiting timestamps for each test
     request_timestamps.clear()
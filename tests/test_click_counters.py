@@ -0,0 +1,76 @@
+# tests/test_click_counters.py
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, insert
+from app.database import URL, ClickCounterFlush
+from app.click_counters import ClickCounterWriteBack, PENDING_CLICKS_KEY, IN_FLIGHT_SET_KEY, unflushed_clicks
+
+async def total_clicks(session_factory, url_id: int) -> int:
+    async with session_factory() as session:
+        return await session.scalar(select(URL.total_clicks).filter(URL.id == url_id))
+
+@pytest.mark.asyncio
+async def test_write_back_moves_pending_clicks_to_db(test_session_factory, committed_urls, test_redis_client):
+    """
+    Test that a write-back adds pending deltas to urls.total_clicks and clears them from Redis.
+    """
+    first, second = await committed_urls(2, "writeback")
+    await test_redis_client.hset(PENDING_CLICKS_KEY, mapping={first.short_code: 3, second.short_code: 1})
+
+    write_back = ClickCounterWriteBack(3600, session_factory=test_session_factory)
+    await write_back.flush(test_redis_client)
+
+    assert await total_clicks(test_session_factory, first.id) == 3
+    assert await total_clicks(test_session_factory, second.id) == 1
+    assert not await test_redis_client.exists(PENDING_CLICKS_KEY)
+    assert await test_redis_client.scard(IN_FLIGHT_SET_KEY) == 0
+
+@pytest.mark.asyncio
+async def test_write_back_retry_is_applied_once(test_session_factory, committed_urls, test_redis_client):
+    """
+    Test that an in-flight hash whose flush was already committed is deleted without being added again.
+    """
+    [url] = await committed_urls(1, "retry")
+    in_flight_key = f"{PENDING_CLICKS_KEY}:crashed"
+    await test_redis_client.sadd(IN_FLIGHT_SET_KEY, in_flight_key)
+    await test_redis_client.hset(in_flight_key, url.short_code, 5)
+    async with test_session_factory() as session:
+        await session.execute(insert(ClickCounterFlush).values(flush_id=in_flight_key))
+        await session.commit()
+
+    await ClickCounterWriteBack(3600, session_factory=test_session_factory).flush(test_redis_client)
+
+    assert await total_clicks(test_session_factory, url.id) == 0
+    assert not await test_redis_client.exists(in_flight_key)
+
+@pytest.mark.asyncio
+async def test_analytics_survive_redis_loss(client: AsyncClient, test_session_factory, committed_urls, test_redis_client):
+    """
+    Test that clicks written back before a Redis flush are still counted after it.
+    """
+    [url] = await committed_urls(1, "redisloss")
+    write_back = ClickCounterWriteBack(3600, session_factory=test_session_factory)
+    for _ in range(3):
+        await client.get(f"/{url.short_code}", follow_redirects=False)
+    assert (await client.get(f"/analytics/{url.short_code}")).json()["total_clicks"] == 3
+    await write_back.flush(test_redis_client)
+
+    await test_redis_client.flushdb()
+    await client.get(f"/{url.short_code}", follow_redirects=False)
+    assert (await client.get(f"/analytics/{url.short_code}")).json()["total_clicks"] == 4
+
+    await write_back.flush(test_redis_client)
+    assert (await client.get(f"/analytics/{url.short_code}")).json()["total_clicks"] == 4
+    assert await total_clicks(test_session_factory, url.id) == 4
+
+@pytest.mark.asyncio
+async def test_unflushed_clicks_sums_pending_and_in_flight(test_redis_client):
+    """
+    Test that unflushed clicks add up the pending hash and every in-flight hash, per code in order.
+    """
+    await test_redis_client.hset(PENDING_CLICKS_KEY, mapping={"a": 1, "b": 2})
+    for in_flight_key, deltas in [(f"{PENDING_CLICKS_KEY}:one", {"a": 10}), (f"{PENDING_CLICKS_KEY}:two", {"a": 100, "c": 5})]:
+        await test_redis_client.hset(in_flight_key, mapping=deltas)
+        await test_redis_client.sadd(IN_FLIGHT_SET_KEY, in_flight_key)
+
+    assert await unflushed_clicks(test_redis_client, ["a", "b", "c", "d"]) == [111, 2, 5, 0]
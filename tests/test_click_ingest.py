@@ -0,0 +1,149 @@
+# tests/test_click_ingest.py
+from datetime import datetime
+import pytest
+from sqlalchemy import select, func, literal_column
+from app.database import ClickEvent, ClickRollupDay
+from app.click_ingest import ClickIngestor
+from app.partitions import ClickPartitionManager, month_start, partition_name
+
+@pytest.mark.parametrize("writer", ["copy", "insert"])
+@pytest.mark.asyncio
+async def test_ingestor_writes_clicks_and_rollups(writer, test_db_engine, test_session_factory, committed_urls):
+    """
+    Test that a batch reaches the partitioned click_events table with its short_code_id,
+    IP and timestamp, and that the daily rollups are updated in the same flush.
+    """
+    await ClickPartitionManager(1, 0, 3600, db_engine=test_db_engine).maintain()
+    first, second = await committed_urls(2, f"ingest-{writer}")
+    ingestor = ClickIngestor(1000, 100, 0.05, writer, session_factory=test_session_factory)
+    before = datetime.utcnow()
+    ingestor.start()
+    for url, ip_address in [(first, "10.0.0.1"), (first, "10.0.0.2"), (second, None)]:
+        assert ingestor.submit(url.id, ip_address)
+    await ingestor.stop()
+    after = datetime.utcnow()
+
+    assert ingestor.written == 3
+    assert ingestor.failed == 0
+    async with test_session_factory() as session:
+        result = await session.execute(
+            select(
+                ClickEvent.short_code_id, ClickEvent.ip_address, ClickEvent.timestamp,
+                literal_column("click_events.tableoid::regclass::text").label("partition"),
+            )
+            .filter(ClickEvent.short_code_id.in_([first.id, second.id]))
+            .order_by(ClickEvent.id)
+        )
+        rows = result.all()
+        rollup = await session.scalar(
+            select(func.sum(ClickRollupDay.clicks)).filter(ClickRollupDay.short_code_id == first.id)
+        )
+
+    assert [(row.short_code_id, row.ip_address) for row in rows] == [
+        (first.id, "10.0.0.1"), (first.id, "10.0.0.2"), (second.id, None),
+    ]
+    assert all(before <= row.timestamp <= after for row in rows)
+    # Rows are routed into the monthly partition covering their timestamp
+    assert all(row.partition == partition_name(month_start(row.timestamp)) for row in rows)
+    assert rollup == 2
+
+@pytest.mark.asyncio
+async def test_stop_flushes_queued_clicks(test_session_factory, committed_urls):
+    """
+    Test that clicks still queued when the ingestor is stopped are written before stop() returns.
+    """
+    [url] = await committed_urls(1, "ingest-stop")
+    # Neither the batch size nor the flush interval is reached, so only stop() can flush
+    ingestor = ClickIngestor(1000, 1000, 3600, session_factory=test_session_factory)
+    ingestor.start()
+    for _ in range(5):
+        ingestor.submit(url.id, "10.0.0.9")
+    assert ingestor.written == 0
+
+    await ingestor.stop()
+
+    assert ingestor.written == 5
+    assert ingestor.stats()["queued"] == 0
+    async with test_session_factory() as session:
+        count = await session.scalar(select(func.count()).filter(ClickEvent.short_code_id == url.id))
+    assert count == 5
+
+class FailingAfterCopyIngestor(ClickIngestor):
+    """
+    Fails every flush right after the COPY, before the commit.
+    """
+
+    async def _copy(self, session, batch):
+        await super()._copy(session, batch)
+        raise RuntimeError("fail after copy")
+
+async def count_clicks(session_factory, url_id: int) -> int:
+    async with session_factory() as session:
+        return await session.scalar(select(func.count()).filter(ClickEvent.short_code_id == url_id))
+
+@pytest.mark.asyncio
+async def test_copy_is_rolled_back_when_the_flush_fails_after_it(test_session_factory, committed_urls):
+    """
+    Test that COPY runs inside the flush transaction, so a failure before the commit leaves no click_events rows.
+    """
+    [url] = await committed_urls(1, "ingest-copy-rollback")
+    ingestor = FailingAfterCopyIngestor(1000, 1000, 3600, "copy", session_factory=test_session_factory)
+    ingestor.start()
+    for _ in range(3):
+        ingestor.submit(url.id, "10.0.0.3")
+    await ingestor.stop()
+
+    assert ingestor.written == 0
+    assert ingestor.failed == 3
+    assert await count_clicks(test_session_factory, url.id) == 0
+
+@pytest.mark.asyncio
+async def test_failed_rollup_leaves_no_raw_clicks(test_session_factory, committed_urls, monkeypatch):
+    """
+    Test that when the rollup upsert fails, none of the batch's clicks are written.
+    """
+    import app.click_ingest
+
+    async def failing_rollups(session, clicks):
+        raise RuntimeError("rollup failed")
+
+    monkeypatch.setattr(app.click_ingest, "apply_click_rollups", failing_rollups)
+    [url] = await committed_urls(1, "ingest-rollup-failure")
+    ingestor = ClickIngestor(1000, 1000, 3600, "copy", session_factory=test_session_factory)
+    ingestor.start()
+    for _ in range(3):
+        ingestor.submit(url.id, "10.0.0.4")
+    await ingestor.stop()
+
+    assert ingestor.failed == 3
+    assert await count_clicks(test_session_factory, url.id) == 0
+
+class FailingOnceIngestor(ClickIngestor):
+    """
+    Fails the first flush attempt after its COPY, then behaves normally.
+    """
+
+    attempts = 0
+
+    async def _copy(self, session, batch):
+        await super()._copy(session, batch)
+        self.attempts += 1
+        if self.attempts == 1:
+            raise RuntimeError("transient failure")
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_once(test_session_factory, committed_urls):
+    """
+    Test that a batch whose first flush fails is written by the retry, exactly once.
+    """
+    [url] = await committed_urls(1, "ingest-retry")
+    ingestor = FailingOnceIngestor(1000, 1000, 3600, "copy", session_factory=test_session_factory)
+    ingestor.start()
+    for _ in range(3):
+        ingestor.submit(url.id, "10.0.0.5")
+    await ingestor.stop()
+
+    assert ingestor.attempts == 2
+    assert ingestor.written == 3
+    assert ingestor.failed == 0
+    assert await count_clicks(test_session_factory, url.id) == 3
@@ -0,0 +1,82 @@
+# tests/test_code_pool.py
+import uuid
+import pytest
+from app import crud
+from app.code_pool import ShortCodePool, POOL_KEY
+from app.schemas import URLCreate
+
+def unique_codes(count: int) -> list[str]:
+    return [uuid.uuid4().hex[:10] for _ in range(count)]
+
+@pytest.mark.asyncio
+async def test_refill_skips_taken_codes_and_stops_at_target(test_redis_client, test_session_factory, committed_urls, monkeypatch):
+    """
+    Test that refill drops generated codes that are already in urls and fills the pool
+    exactly up to target_size.
+    """
+    import app.code_pool
+    taken = [row.short_code for row in await committed_urls(2, f"pool{uuid.uuid4().hex[:6]}-")]
+    fresh = unique_codes(4)
+    # Batches of 3, 2 and 1: each batch after the first only asks for what is still missing
+    generated = iter([taken[0], fresh[0], fresh[1], taken[1], fresh[2], fresh[3]])
+    monkeypatch.setattr(app.code_pool, "generate_short_code", lambda: next(generated))
+    pool = ShortCodePool(4, 2, 3, 3600, session_factory=test_session_factory)
+
+    added = await pool.refill(test_redis_client)
+
+    assert added == 4
+    assert set(await test_redis_client.lrange(POOL_KEY, 0, -1)) == set(fresh)
+    assert (pool.codes_added, pool.codes_rejected, pool.refills, pool.low_water_events) == (4, 2, 1, 1)
+
+@pytest.mark.asyncio
+async def test_refill_is_a_no_op_above_low_water_mark(test_redis_client, test_session_factory, monkeypatch):
+    """
+    Test that refill neither generates codes nor touches the pool while it is at or above low_water_mark.
+    """
+    import app.code_pool
+
+    def fail():
+        raise AssertionError("no codes should be generated")
+
+    monkeypatch.setattr(app.code_pool, "generate_short_code", fail)
+    await test_redis_client.rpush(POOL_KEY, *unique_codes(3))
+    pool = ShortCodePool(10, 2, 5, 3600, session_factory=test_session_factory)
+
+    assert await pool.refill(test_redis_client) == 0
+    assert await test_redis_client.llen(POOL_KEY) == 3
+    assert (pool.refills, pool.low_water_events) == (0, 0)
+
+@pytest.mark.asyncio
+async def test_pops_count_empty_pool(test_redis_client):
+    """
+    Test that pop and pop_many record an empty pop when the pool cannot satisfy them.
+    """
+    pool = ShortCodePool(10, 2, 5, 3600)
+    assert await pool.pop(test_redis_client) is None
+    assert (pool.pops, pool.empty_pops) == (0, 1)
+
+    [code] = unique_codes(1)
+    await test_redis_client.rpush(POOL_KEY, code)
+    assert await pool.pop_many(test_redis_client, 3) == [code]
+    assert (pool.pops, pool.empty_pops) == (1, 2)
+
+    assert await pool.pop_many(test_redis_client, 2) == []
+    assert (pool.pops, pool.empty_pops) == (1, 3)
+
+@pytest.mark.asyncio
+async def test_create_short_url_uses_pooled_code_then_falls_back(db_session, test_redis_client, monkeypatch):
+    """
+    Test that with SHORT_CODE_STRATEGY="pool" a create takes the popped code, and a create
+    after the pool ran dry falls back to a random code.
+    """
+    pooled, random_code = unique_codes(2)
+    monkeypatch.setattr(crud.settings, "SHORT_CODE_STRATEGY", "pool")
+    monkeypatch.setattr(crud, "generate_short_code", lambda: random_code)
+    await test_redis_client.rpush(POOL_KEY, pooled)
+
+    first = await crud.create_short_url(db_session, URLCreate(long_url="https://pool.test.com/first"), test_redis_client)
+    second = await crud.create_short_url(db_session, URLCreate(long_url="https://pool.test.com/second"), test_redis_client)
+
+    assert first.short_code == pooled
+    assert second.short_code == random_code
+    assert await test_redis_client.llen(POOL_KEY) == 0
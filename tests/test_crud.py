@@ -0,0 +1,56 @@
+# tests/test_crud.py
+import uuid
+import pytest
+from sqlalchemy import select
+from app import crud
+from app.database import URL
+from app.schemas import URLCreate
+
+@pytest.mark.asyncio
+async def test_create_short_url_retries_on_short_code_collision(db_session, test_redis_client, monkeypatch):
+    """
+    Test that a create whose first generated code is already taken retries with a new code
+    instead of failing or overwriting the existing URL.
+    """
+    existing = await crud.create_short_url(db_session, URLCreate(long_url="https://collision.test.com/first"), test_redis_client)
+
+    fresh_code = uuid.uuid4().hex[:10]
+    codes = iter([existing.short_code, fresh_code])
+    monkeypatch.setattr(crud, "generate_short_code", lambda: next(codes))
+    created = await crud.create_short_url(db_session, URLCreate(long_url="https://collision.test.com/second"), test_redis_client)
+
+    assert created.short_code == fresh_code
+    assert created.id != existing.id
+    assert created.long_url == "https://collision.test.com/second"
+    stored = await db_session.scalar(select(URL.long_url).filter(URL.short_code == existing.short_code))
+    assert stored == "https://collision.test.com/first"
+
+@pytest.mark.parametrize("batch", [False, True])
+@pytest.mark.asyncio
+async def test_analytics_reads_redis_deltas_before_the_row(batch, db_session, test_redis_client, monkeypatch):
+    """
+    Test that analytics read the unflushed Redis deltas before urls.total_clicks, so a
+    concurrent write-back can only make clicks count twice, never drop them.
+    """
+    created = await crud.create_short_url(db_session, URLCreate(long_url="https://analytics-order.test.com"), test_redis_client)
+    reads = []
+    real_unflushed_clicks = crud.unflushed_clicks
+    real_execute = db_session.execute
+
+    async def recording_unflushed_clicks(redis_client, short_codes):
+        reads.append("redis")
+        return await real_unflushed_clicks(redis_client, short_codes)
+
+    async def recording_execute(*args, **kwargs):
+        reads.append("db")
+        return await real_execute(*args, **kwargs)
+
+    monkeypatch.setattr(crud, "unflushed_clicks", recording_unflushed_clicks)
+    monkeypatch.setattr(db_session, "execute", recording_execute)
+    if batch:
+        [analytics] = await crud.get_url_analytics_batch(db_session, [created.short_code, "missingcode"], test_redis_client)
+    else:
+        analytics = await crud.get_url_analytics(db_session, created.short_code, test_redis_client)
+
+    assert analytics["total_clicks"] == 0
+    assert reads == ["redis", "db"]
@@ -0,0 +1,35 @@
+# tests/test_database.py
+import pytest
+from sqlalchemy import text
+from app.database import SCHEMA_UPGRADES
+
+async def run_schema_upgrades(engine):
+    async with engine.begin() as conn:
+        for statement in SCHEMA_UPGRADES:
+            await conn.execute(text(statement))
+
+async def total_clicks(engine, url_id: int) -> int:
+    async with engine.connect() as conn:
+        return await conn.scalar(text("SELECT total_clicks FROM urls WHERE id = :id"), {"id": url_id})
+
+@pytest.mark.asyncio
+async def test_total_clicks_upgrade_backfills_once(test_db_engine, committed_urls):
+    """
+    Test that adding urls.total_clicks to an existing table backfills it from click_events,
+    and that later upgrade runs leave the counter alone.
+    """
+    [url] = await committed_urls(1, "backfill")
+    async with test_db_engine.begin() as conn:
+        await conn.execute(
+            text("INSERT INTO click_events (short_code_id, timestamp) VALUES (:id, now()), (:id, now())"),
+            {"id": url.id},
+        )
+        await conn.execute(text("ALTER TABLE urls DROP COLUMN total_clicks"))
+
+    await run_schema_upgrades(test_db_engine)
+    assert await total_clicks(test_db_engine, url.id) == 2
+
+    async with test_db_engine.begin() as conn:
+        await conn.execute(text("UPDATE urls SET total_clicks = 7 WHERE id = :id"), {"id": url.id})
+    await run_schema_upgrades(test_db_engine)
+    assert await total_clicks(test_db_engine, url.id) == 7
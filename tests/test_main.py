@@ -1,7 +1,13 @@
 # tests/test_main.py
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
 import pytest
 from httpx import AsyncClient
 from app.config import settings
+from app.database import ClickEvent
 from app.main import request_timestamps # Import for clearing in tests
 
 @pytest.mark.asyncio
@@ -91,6 +97,7 @@ async def test_get_url_analytics(client: AsyncClient):
     assert data["short_code"] == short_code
     assert data["long_url"] == long_url
     assert data["total_clicks"] == 2
+    assert data["unique_visitors"] == 1
     assert "created_at" in data
 
 @pytest.mark.asyncio
@@ -121,3 +128,325 @@ async def test_rate_limiting(client: AsyncClient):
     response = await client.post("/shorten", json={"long_url": f"{long_url_base}overlimit"})
     assert response.status_code == 429
     assert "Rate limit exceeded" in response.json()["detail"]
+
+@pytest.mark.asyncio
+async def test_cache_metrics(client: AsyncClient):
+    """
+    Test that repeated redirects are served from the in-process cache.
+    """
+    shorten_response = await client.post("/shorten", json={"long_url": "https://l1.cache.test.com"})
+    short_code = shorten_response.json()["short_code"]
+
+    before = (await client.get("/metrics/cache")).json()["positive"]
+    await client.get(f"/{short_code}", follow_redirects=False)
+    await client.get(f"/{short_code}", follow_redirects=False)
+    after = (await client.get("/metrics/cache")).json()["positive"]
+
+    assert after["hits"] >= before["hits"] + 1
+    for key in ("misses", "evictions", "size", "max_size"):
+        assert key in after
+
+@pytest.mark.asyncio
+async def test_repeated_unknown_code_uses_negative_cache(client: AsyncClient):
+    """
+    Test that a repeated lookup of an unknown code is answered from the negative cache.
+    """
+    before = (await client.get("/metrics/cache")).json()["negative"]
+    for _ in range(2):
+        response = await client.get("/nonexistentscan", follow_redirects=False)
+        assert response.status_code == 404
+    after = (await client.get("/metrics/cache")).json()["negative"]
+    assert after["hits"] >= before["hits"] + 1
+
+@pytest.mark.asyncio
+async def test_create_short_urls_batch(client: AsyncClient):
+    """
+    Test batch URL shortening with per-item errors, in input order.
+    """
+    items = [
+        {"long_url": "https://batch.test.com/one"},
+        {"long_url": "not-a-valid-url"},
+        {"long_url": "https://batch.test.com/two"},
+    ]
+    response = await client.post("/shorten/batch", json=items)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 2
+    assert data["failed"] == 1
+
+    results = data["results"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert results[0]["long_url"] == items[0]["long_url"]
+    assert results[2]["long_url"] == items[2]["long_url"]
+    assert results[1]["error"] and results[1]["short_code"] is None
+
+    redirect_response = await client.get(f"/{results[2]['short_code']}", follow_redirects=False)
+    assert redirect_response.status_code == 307
+    assert redirect_response.headers["location"] == items[2]["long_url"]
+
+@pytest.mark.asyncio
+async def test_get_url_timeseries(client: AsyncClient):
+    """
+    Test that the timeseries endpoint returns gap-filled buckets in columnar form.
+    """
+    shorten_response = await client.post("/shorten", json={"long_url": "https://timeseries.test.com"})
+    short_code = shorten_response.json()["short_code"]
+
+    response = await client.get(
+        f"/analytics/{short_code}/timeseries",
+        params={"from": "2026-01-01T00:00:00", "to": "2026-01-04T00:00:00", "granularity": "day"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["granularity"] == "day"
+    assert data["step_seconds"] == 86400
+    assert data["start"].startswith("2026-01-01T00:00:00")
+    assert data["counts"] == [0, 0, 0]
+
+    response = await client.get(
+        f"/analytics/{short_code}/timeseries",
+        params={"from": "2026-01-04T00:00:00", "to": "2026-01-01T00:00:00"},
+    )
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_trending_links(client: AsyncClient):
+    """
+    Test that clicked links show up in the trending endpoint and unknown windows are rejected.
+    """
+    shorten_response = await client.post("/shorten", json={"long_url": "https://trending.test.com"})
+    short_code = shorten_response.json()["short_code"]
+    for _ in range(3):
+        await client.get(f"/{short_code}", follow_redirects=False)
+
+    response = await client.get("/analytics/trending", params={"window": "1h", "limit": 1000})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["window"] == "1h"
+    scores = {link["short_code"]: link["score"] for link in data["links"]}
+    assert scores[short_code] > 2.9
+
+    response = await client.get("/analytics/trending", params={"window": "7y"})
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_export_clicks(client: AsyncClient):
+    """
+    Test that the click log export streams CSV and rejects unknown codes.
+    """
+    shorten_response = await client.post("/shorten", json={"long_url": "https://export.test.com"})
+    short_code = shorten_response.json()["short_code"]
+
+    response = await client.get(f"/analytics/{short_code}/clicks/export", params={"format": "csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines()[0] == "timestamp,ip_address"
+
+    response = await client.get("/analytics/nonexistentexport/clicks/export")
+    assert response.status_code == 404
+
+async def insert_export_clicks(session_factory, url_id: int) -> list:
+    """
+    Commits three clicks for one URL, out of timestamp order, and returns them oldest first.
+    """
+    clicks = [
+        (datetime(2026, 3, 14, 15, 9, 26), "10.0.0.2"),
+        (datetime(2026, 3, 14, 15, 9, 25), "10.0.0.1"),
+        (datetime(2026, 3, 14, 15, 9, 27), None),
+    ]
+    async with session_factory() as session:
+        session.add_all(ClickEvent(short_code_id=url_id, timestamp=timestamp, ip_address=ip) for timestamp, ip in clicks)
+        await session.commit()
+    return sorted(clicks, key=lambda click: click[0])
+
+@pytest.mark.asyncio
+async def test_export_clicks_ndjson_rows(client: AsyncClient, test_session_factory, committed_urls):
+    """
+    Test that the NDJSON export streams one object per click, oldest first.
+    """
+    [url] = await committed_urls(1, "export-ndjson")
+    clicks = await insert_export_clicks(test_session_factory, url.id)
+
+    response = await client.get(
+        f"/analytics/{url.short_code}/clicks/export", params={"format": "ndjson"}, headers={"Accept-Encoding": "identity"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert "content-encoding" not in response.headers
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {"timestamp": timestamp.isoformat(), "ip_address": ip} for timestamp, ip in clicks
+    ]
+
+@pytest.mark.asyncio
+async def test_export_clicks_csv_rows(client: AsyncClient, test_session_factory, committed_urls):
+    """
+    Test that the CSV export streams the header and one row per click, oldest first.
+    """
+    [url] = await committed_urls(1, "export-csv")
+    clicks = await insert_export_clicks(test_session_factory, url.id)
+
+    response = await client.get(
+        f"/analytics/{url.short_code}/clicks/export", params={"format": "csv"}, headers={"Accept-Encoding": "identity"}
+    )
+    assert response.status_code == 200
+    assert list(csv.reader(io.StringIO(response.text))) == [
+        ["timestamp", "ip_address"],
+        *([timestamp.isoformat(), ip or ""] for timestamp, ip in clicks),
+    ]
+
+@pytest.mark.asyncio
+async def test_export_clicks_gzip(client: AsyncClient, test_session_factory, committed_urls):
+    """
+    Test that the export is gzipped when the client accepts gzip, and decompresses to the plain body.
+    """
+    [url] = await committed_urls(1, "export-gzip")
+    await insert_export_clicks(test_session_factory, url.id)
+    path = f"/analytics/{url.short_code}/clicks/export"
+
+    plain = await client.get(path, headers={"Accept-Encoding": "identity"})
+    # Read the raw body, since httpx would otherwise decode it transparently
+    async with client.stream("GET", path, headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        compressed = b"".join([chunk async for chunk in response.aiter_raw()])
+
+    assert gzip.decompress(compressed) == plain.content
+    assert len(plain.text.splitlines()) == 3
+
+@pytest.mark.asyncio
+async def test_get_url_analytics_batch(client: AsyncClient):
+    """
+    Test batch analytics in request order, with unknown codes reported separately.
+    """
+    codes = []
+    for i in range(2):
+        shorten_response = await client.post("/shorten", json={"long_url": f"https://analytics-batch.test.com/{i}"})
+        codes.append(shorten_response.json()["short_code"])
+    await client.get(f"/{codes[1]}", follow_redirects=False)
+
+    response = await client.post("/analytics/batch", json=[codes[1], "nonexistentbatch", codes[0]])
+    assert response.status_code == 200
+    data = response.json()
+    assert [result["short_code"] for result in data["results"]] == [codes[1], codes[0]]
+    assert [result["total_clicks"] for result in data["results"]] == [1, 0]
+    assert data["not_found"] == ["nonexistentbatch"]
+
+@pytest.mark.asyncio
+async def test_fast_redirect_sends_l1_hit_before_counting(monkeypatch):
+    """
+    Test that on an L1 hit the middleware sends the whole 307 before it awaits the click count.
+    """
+    import app.main as main_module
+    from app.schemas import CachedURL
+
+    events = []
+
+    async def send(message):
+        events.append(message["type"])
+
+    async def count_click(**kwargs):
+        events.append("count")
+
+    main_crud = main_module.crud
+    monkeypatch.setattr(main_crud, "resolve_and_count_click", count_click)
+    monkeypatch.setattr(main_crud.click_ingestor, "submit", lambda url_id, ip_address: True)
+    main_crud.url_cache.set("l1sendfirst", CachedURL(id=1, long_url="https://l1-send-first.test.com", created_at=datetime.utcnow()))
+    middleware = main_module.FastRedirectMiddleware(None, fastapi_app=main_module.app)
+    scope = {"type": "http", "method": "GET", "path": "/l1sendfirst", "headers": [], "client": ("10.0.0.1", 1234)}
+
+    try:
+        await middleware(scope, None, send)
+    finally:
+        main_crud.url_cache.invalidate("l1sendfirst")
+
+    assert events == ["http.response.start", "http.response.body", "count"]
+
+@pytest.fixture
+def dedup_long_urls(monkeypatch):
+    """
+    Enables DEDUP_LONG_URLS on the settings object the app modules use.
+    """
+    import app.main as main_module
+    monkeypatch.setattr(main_module.crud.settings, "DEDUP_LONG_URLS", True)
+
+async def count_urls_with_hash(db_session, long_url: str) -> int:
+    from sqlalchemy import select, func
+    from app.database import URL
+    from app.utils import long_url_digest
+    return await db_session.scalar(select(func.count()).filter(URL.long_url_hash == long_url_digest(long_url)))
+
+@pytest.mark.asyncio
+async def test_dedup_same_url_returns_existing(client: AsyncClient, db_session, dedup_long_urls):
+    """
+    Test that shortening the same URL twice returns the same code and id and stores one row.
+    """
+    long_url = "https://dedup-same.test.com/page"
+    first = (await client.post("/shorten", json={"long_url": long_url})).json()
+    second = (await client.post("/shorten", json={"long_url": long_url})).json()
+
+    assert (second["short_code"], second["id"]) == (first["short_code"], first["id"])
+    assert await count_urls_with_hash(db_session, long_url) == 1
+
+@pytest.mark.asyncio
+async def test_dedup_equivalent_spellings_share_one_row(client: AsyncClient, db_session, dedup_long_urls):
+    """
+    Test that two spellings of the same destination (case, default port, empty path) resolve to one row.
+    """
+    first = (await client.post("/shorten", json={"long_url": "HTTPS://Dedup-Spelling.Test.com:443"})).json()
+    second = (await client.post("/shorten", json={"long_url": "https://dedup-spelling.test.com/"})).json()
+
+    assert (second["short_code"], second["id"]) == (first["short_code"], first["id"])
+    assert await count_urls_with_hash(db_session, "https://dedup-spelling.test.com/") == 1
+
+@pytest.mark.asyncio
+async def test_dedup_within_one_batch(client: AsyncClient, db_session, dedup_long_urls):
+    """
+    Test that duplicates inside one /shorten/batch call resolve to one row and are counted as existing.
+    """
+    repeated = "https://dedup-batch.test.com/repeated"
+    items = [{"long_url": repeated}, {"long_url": "https://dedup-batch.test.com/other"}, {"long_url": repeated}]
+    response = await client.post("/shorten/batch", json=items)
+
+    assert response.status_code == 200
+    data = response.json()
+    first, _, duplicate = data["results"]
+    assert (duplicate["short_code"], duplicate["id"]) == (first["short_code"], first["id"])
+    assert (data["created"], data["existing"], data["failed"]) == (2, 1, 0)
+    assert await count_urls_with_hash(db_session, repeated) == 1
+
+@pytest.mark.asyncio
+async def test_cached_redirect_never_opens_a_session(client: AsyncClient, test_session_factory):
+    """
+    Test that a redirect served from cache never creates a database session, both through
+    FastRedirectMiddleware and through the redirect_to_long_url route it stands in for.
+    """
+    import app.main as main_module
+    from starlette.requests import Request
+    from app.database import LazySession
+
+    shorten_response = await client.post("/shorten", json={"long_url": "https://lazy-session.test.com"})
+    short_code = shorten_response.json()["short_code"]
+    sessions_opened = []
+
+    def counting_session_factory():
+        sessions_opened.append(True)
+        return test_session_factory()
+
+    async def override_get_db():
+        session = LazySession(counting_session_factory)
+        try:
+            yield session
+        finally:
+            await session.close()
+
+    main_module.app.dependency_overrides[main_module.get_db] = override_get_db
+    response = await client.get(f"/{short_code}", follow_redirects=False)
+    assert response.status_code == 307
+    assert sessions_opened == []
+
+    db = LazySession(counting_session_factory)
+    request = Request({"type": "http", "method": "GET", "path": f"/{short_code}", "headers": [], "client": ("10.0.0.1", 1234)})
+    response = await main_module.redirect_to_long_url(short_code, request, db, main_module.app_redis_client)
+    assert response.status_code == 307
+    assert not db.started
+    assert sessions_opened == []
@@ -0,0 +1,49 @@
+# tests/test_partitions.py
+from datetime import datetime
+import pytest
+from sqlalchemy import text
+from app.partitions import ClickPartitionManager, month_start, next_month, partition_name
+
+def test_monthly_partition_bounds():
+    """
+    Test that partitions cover whole calendar months, including across a year boundary.
+    """
+    start = month_start(datetime(2026, 12, 31, 23, 59, 59))
+    assert start == datetime(2026, 12, 1)
+    assert next_month(start) == datetime(2027, 1, 1)
+    assert next_month(datetime(2026, 1, 1)) == datetime(2026, 2, 1)
+    assert partition_name(start) == "click_events_p202612"
+
+@pytest.mark.asyncio
+async def test_maintain_creates_future_and_drops_expired_partitions(test_db_engine, committed_urls):
+    """
+    Test that maintenance creates monthly partitions ahead, moves clicks out of the default
+    partition into a new one, and drops partitions older than the retention period.
+    """
+    this_month = month_start(datetime.utcnow())
+    two_months_ahead = next_month(next_month(this_month))
+    [url] = await committed_urls(1, "partitioned")
+    async with test_db_engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS click_events_p200001 PARTITION OF click_events "
+            "FOR VALUES FROM ('2000-01-01') TO ('2000-02-01')"
+        ))
+        # No partition covers this month yet, so the click lands in the default partition
+        click_id = await conn.scalar(
+            text("INSERT INTO click_events (short_code_id, timestamp) VALUES (:id, :ts) RETURNING id"),
+            {"id": url.id, "ts": two_months_ahead.replace(day=15)},
+        )
+
+    manager = ClickPartitionManager(months_ahead=2, retention_days=30, check_interval=3600, db_engine=test_db_engine)
+    await manager.maintain()
+
+    async with test_db_engine.connect() as conn:
+        partitions = set(await manager._partitions(conn))
+        location = await conn.scalar(
+            text("SELECT tableoid::regclass::text FROM click_events WHERE id = :id"), {"id": click_id}
+        )
+    assert {partition_name(this_month), partition_name(next_month(this_month)), partition_name(two_months_ahead)} <= partitions
+    assert "click_events_default" in partitions
+    assert "click_events_p200001" not in partitions
+    assert location == partition_name(two_months_ahead)
+    assert manager.dropped == 1
@@ -0,0 +1,43 @@
+# tests/test_redis_scripts.py
+from datetime import datetime
+import pytest
+from app.crud import _click_script_args
+from app.click_counters import PENDING_CLICKS_KEY
+from app.redis_scripts import RESOLVE_AND_COUNT_CLICK
+from app.schemas import CachedURL
+
+@pytest.mark.asyncio
+async def test_click_script_counts_renews_ttl_and_streams_in_one_call(test_redis_client):
+    """
+    Test that one script call returns the record, counts the click, appends it to the
+    click stream and extends the TTL of a hot record.
+    """
+    short_code = "scriptHot"
+    call = _click_script_args(True, short_code, "10.1.1.1")
+    short_key, stream_key, hits_key, visitors_key = call["keys"][:4]
+    call["args"][1] = 1000  # enable the stream for this call
+    ttl_min, hits_per_doubling = int(call["args"][4]), int(call["args"][6])
+
+    record = CachedURL(id=1, long_url="https://script.test.com", created_at=datetime.utcnow()).model_dump_json()
+    await test_redis_client.set(short_key, record, ex=10)
+    # Enough recent hits for several TTL doublings
+    await test_redis_client.set(hits_key, hits_per_doubling * 3)
+
+    script = test_redis_client.register_script(RESOLVE_AND_COUNT_CLICK)
+    assert await script(keys=call["keys"], args=call["args"]) == record
+
+    assert await test_redis_client.ttl(short_key) >= ttl_min
+    assert await test_redis_client.hget(PENDING_CLICKS_KEY, short_code) == "1"
+    assert await test_redis_client.pfcount(visitors_key) == 1
+    [(_, fields)] = await test_redis_client.xrange(stream_key)
+    assert fields == {"code": short_code, "ip": "10.1.1.1"}
+
+@pytest.mark.asyncio
+async def test_click_script_counts_nothing_on_cache_miss(test_redis_client):
+    """
+    Test that a missing record returns nil without counting, so the DB fallback counts the click once.
+    """
+    call = _click_script_args(True, "scriptMiss", "10.1.1.2")
+    script = test_redis_client.register_script(RESOLVE_AND_COUNT_CLICK)
+    assert await script(keys=call["keys"], args=call["args"]) is None
+    assert not await test_redis_client.exists(PENDING_CLICKS_KEY)
@@ -0,0 +1,61 @@
+# tests/test_rehydrate.py
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+from app.database import ClickRollupHour
+from app.rehydrate import CacheRehydrator
+
+@pytest.mark.asyncio
+async def test_rehydrate_loads_links_ranked_by_rollups(test_session_factory, committed_urls, test_redis_client):
+    """
+    Test that rehydration reads recent clicks from the hourly rollups and loads records into Redis.
+    """
+    cold, hot = await committed_urls(2, "rehydrate")
+    hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    async with test_session_factory() as session:
+        await session.execute(insert(ClickRollupHour), [
+            {"short_code_id": hot.id, "bucket_start": hour - timedelta(hours=1), "clicks": 40},
+            {"short_code_id": hot.id, "bucket_start": hour, "clicks": 2},
+            {"short_code_id": cold.id, "bucket_start": hour, "clicks": 1},
+        ])
+        await session.commit()
+
+    rehydrator = CacheRehydrator(hot_set_size=1, max_keys=1, batch_size=10, window_days=7, session_factory=test_session_factory)
+    loaded = await rehydrator.rehydrate(test_redis_client)
+
+    assert loaded == 1
+    assert rehydrator.ready
+    assert await test_redis_client.exists(f"short:{hot.short_code}")
+    assert not await test_redis_client.exists(f"short:{cold.short_code}")
+
+@pytest.mark.asyncio
+async def test_readiness_flips_once_hot_set_is_loaded(client, monkeypatch, test_session_factory, committed_urls, test_redis_client):
+    """
+    Test that /health/ready reports 503 while the hot set is missing from Redis and 200 once it is loaded.
+    """
+    from app.main import cache_rehydrator
+
+    hot_urls = await committed_urls(3, "readiness")
+    hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    async with test_session_factory() as session:
+        await session.execute(insert(ClickRollupHour), [
+            {"short_code_id": url.id, "bucket_start": hour, "clicks": 10} for url in hot_urls
+        ])
+        await session.commit()
+
+    monkeypatch.setattr(cache_rehydrator, "ready", False)
+    monkeypatch.setattr(cache_rehydrator, "hot_set_size", len(hot_urls))
+    monkeypatch.setattr(cache_rehydrator, "session_factory", test_session_factory)
+    # Run the job explicitly below instead of in the background
+    monkeypatch.setattr(cache_rehydrator, "start", lambda redis_client: None)
+
+    response = await client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "rehydrating"
+
+    await cache_rehydrator.rehydrate(test_redis_client, limit=len(hot_urls))
+
+    response = await client.get("/health/ready")
+    assert response.status_code == 200
+    for url in hot_urls:
+        assert await test_redis_client.exists(f"short:{url.short_code}")
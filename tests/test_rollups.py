@@ -0,0 +1,51 @@
+# tests/test_rollups.py
+from datetime import datetime
+import pytest
+from app.rollups import bucket_start
+
+def test_bucket_start_truncates_to_each_granularity():
+    """
+    Test that timestamps are truncated to the start of their minute, hour and day buckets.
+    """
+    timestamp = datetime(2026, 3, 14, 15, 9, 26, 535897)
+    assert bucket_start(timestamp, "minute") == datetime(2026, 3, 14, 15, 9)
+    assert bucket_start(timestamp, "hour") == datetime(2026, 3, 14, 15)
+    assert bucket_start(timestamp, "day") == datetime(2026, 3, 14)
+
+def test_bucket_start_rejects_unknown_granularity():
+    """
+    Test that an unsupported granularity raises instead of silently bucketing.
+    """
+    with pytest.raises(ValueError):
+        bucket_start(datetime(2026, 3, 14), "week")
+
+@pytest.mark.asyncio
+async def test_rollup_rows_are_upserted_in_key_order(monkeypatch):
+    """
+    Test that rollup rows are sent sorted by (short_code_id, bucket_start), whatever order
+    clicks arrived in, so concurrent flushes lock shared rows in the same order.
+    """
+    from app import rollups
+
+    sent_rows = []
+    real_pg_insert = rollups.pg_insert
+
+    class RecordingInsert:
+        def __init__(self, table):
+            self.table = table
+
+        def values(self, rows):
+            sent_rows.append([(row["short_code_id"], row["bucket_start"]) for row in rows])
+            return real_pg_insert(self.table).values(rows)
+
+    class DiscardingSession:
+        async def execute(self, statement):
+            pass
+
+    monkeypatch.setattr(rollups, "pg_insert", RecordingInsert)
+    clicks = [(2, datetime(2026, 3, 14, 15, 9)), (1, datetime(2026, 3, 14, 16, 0)), (1, datetime(2026, 3, 14, 15, 0))]
+    await rollups.apply_click_rollups(DiscardingSession(), clicks)
+
+    assert len(sent_rows) == len(rollups.ROLLUP_TABLES)
+    for keys in sent_rows:
+        assert keys == sorted(keys)
@@ -0,0 +1,92 @@
+# tests/test_singleflight.py
+import asyncio
+import pytest
+from app import crud
+from app.singleflight import SingleFlight
+
+class CountingSession:
+    """
+    Wraps a session and counts the queries run through it.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.queries = 0
+
+    async def scalar(self, statement):
+        self.queries += 1
+        return await self.session.scalar(statement)
+
+@pytest.mark.asyncio
+async def test_concurrent_loads_share_one_fetch(test_redis_client, test_session_factory, committed_urls, monkeypatch):
+    """
+    Test that concurrent cache misses for one code run one DB query and one Redis setex,
+    and that every caller gets the record.
+    """
+    [url] = await committed_urls(1, "singleflight")
+    url_fetches = SingleFlight()
+    monkeypatch.setattr(crud, "url_fetches", url_fetches)
+    setex_calls = []
+    real_setex = test_redis_client.setex
+
+    async def counting_setex(*args, **kwargs):
+        setex_calls.append(args[0])
+        return await real_setex(*args, **kwargs)
+
+    monkeypatch.setattr(test_redis_client, "setex", counting_setex)
+    try:
+        async with test_session_factory() as session:
+            db = CountingSession(session)
+            records = await asyncio.gather(*(crud.load_url_record(db, url.short_code, test_redis_client) for _ in range(5)))
+    finally:
+        crud.url_cache.invalidate(url.short_code)
+
+    assert [record.id for record in records] == [url.id] * 5
+    assert db.queries == 1
+    assert setex_calls == [f"short:{url.short_code}"]
+    assert url_fetches.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 4}
+
+@pytest.mark.asyncio
+async def test_leader_exception_reaches_every_waiter():
+    """
+    Test that when the leader's call raises, every coalesced caller gets the same exception.
+    """
+    flight = SingleFlight()
+    release = asyncio.Event()
+    error = RuntimeError("fetch failed")
+
+    async def failing_fetch():
+        await release.wait()
+        raise error
+
+    calls = [asyncio.create_task(flight.do("code", failing_fetch)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*calls, return_exceptions=True)
+
+    assert all(result is error for result in results)
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 2}
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_hands_fetch_to_waiter():
+    """
+    Test that cancelling the leader does not cancel its waiters: one of them runs the fetch instead.
+    """
+    flight = SingleFlight()
+
+    async def hanging_fetch():
+        await asyncio.Event().wait()
+
+    async def fetch():
+        return "record"
+
+    leader = asyncio.create_task(flight.do("code", hanging_fetch))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(flight.do("code", fetch))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    assert await waiter == "record"
+    assert flight.stats() == {"in_flight": 0, "leaders": 2, "coalesced": 1}
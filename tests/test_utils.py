@@ -0,0 +1,36 @@
+# tests/test_utils.py
+from app.utils import encode_base62, decode_base62, scramble_id, canonicalize_url, long_url_digest
+
+def test_base62_round_trip():
+    """
+    Test that base62 codes are fixed-length and decode back to the same integer.
+    """
+    for number in (0, 1, 61, 62, 123456789, 62 ** 8 - 1):
+        code = encode_base62(number, 8)
+        assert len(code) == 8
+        assert decode_base62(code) == number
+
+def test_base62_preserves_order():
+    """
+    Test that sequential IDs produce lexicographically increasing codes.
+    """
+    codes = [encode_base62(number, 8) for number in range(1000)]
+    assert codes == sorted(codes)
+
+def test_scramble_id_is_a_bijection():
+    """
+    Test that scrambling permutes the whole code space without collisions.
+    """
+    length = 3
+    scrambled = {scramble_id(number, length, "test-key") for number in range(62 ** length)}
+    assert scrambled == set(range(62 ** length))
+
+def test_canonicalize_url():
+    """
+    Test that trivially different spellings of a URL share one digest.
+    """
+    assert canonicalize_url("HTTPS://Example.COM:443") == "https://example.com/"
+    assert canonicalize_url("http://example.com:8080/a?b=1#c") == "http://example.com:8080/a?b=1#c"
+    assert long_url_digest("https://EXAMPLE.com/") == long_url_digest("https://example.com")
+    assert long_url_digest("https://example.com/?a=1") != long_url_digest("https://example.com/?a=2")
+    assert len(long_url_digest("https://example.com")) == 32